@@ -0,0 +1,55 @@
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.urls import URLPattern
+
+from .utils import close_unusable_connections
+
+ASYNC_READ_ROUTES = ('recipe-list', 'recipe-detail',
+                     'tag-list', 'tag-detail',
+                     'ingredient-list', 'ingredient-detail')
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def async_read_view(view):
+    """Функция-обертка над синхронным представлением DRF для ASGI-режима:
+    чтение выполняется в общем пуле потоков, запись - в потоке,
+    закрепленном за соединением с БД."""
+
+    def read(request, *args, **kwargs):
+        close_unusable_connections()
+        try:
+            response = view(request, *args, **kwargs)
+            # Рендеринг тоже обращается к ленивым запросам, поэтому
+            # выполняется в том же потоке, что и представление.
+            response.render()
+            return response
+        finally:
+            # Соединения привязаны к потоку пула: request_finished для них
+            # в этом потоке не приходит, и CONN_MAX_AGE проверяется здесь.
+            close_old_connections()
+
+    read = sync_to_async(read, thread_sensitive=False)
+    write = sync_to_async(view)
+
+    async def wrapper(request, *args, **kwargs):
+        if request.method in READ_METHODS:
+            return await read(request, *args, **kwargs)
+        return await write(request, *args, **kwargs)
+
+    wrapper.csrf_exempt = True
+    wrapper.cls = view.cls
+    wrapper.initkwargs = view.initkwargs
+    return wrapper
+
+
+def async_read_urls(urls, names=ASYNC_READ_ROUTES):
+    "Функция замены маршрутов чтения на асинхронные представления."
+
+    return [
+        URLPattern(url.pattern,
+                   async_read_view(url.callback),
+                   url.default_args,
+                   url.name)
+        if isinstance(url, URLPattern) and url.name in names else url
+        for url in urls
+    ]
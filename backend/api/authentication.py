@@ -0,0 +1,140 @@
+import copy
+import threading
+import time
+
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+class TokenCache:
+    "Ограниченный LRU-кэш токенов с временем жизни записей."
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def delete_user(self, user_id):
+        with self.lock:
+            for key, (_, (_, (user, _), _)) in list(self.entries.items()):
+                if user.pk == user_id:
+                    del self.entries[key]
+
+
+token_cache = TokenCache(settings.TOKEN_AUTH_CACHE['MAX_SIZE'],
+                         settings.TOKEN_AUTH_CACHE['TTL'])
+
+
+def get_shared_cache():
+    return caches[settings.TOKEN_AUTH_CACHE['SHARED_CACHE']]
+
+
+def get_shared_key(key):
+    return f'auth:token:{key}'
+
+
+def get_generation_key(key):
+    return f'auth:token:{key}:generation'
+
+
+def revoke_tokens(keys):
+    """Функция отзыва токенов: смена поколения в общем кэше делает
+    недействительными записи о токенах в памяти всех процессов."""
+
+    shared_cache = get_shared_cache()
+    for key in keys:
+        token_cache.delete(key)
+        try:
+            shared_cache.incr(get_generation_key(key))
+        except ValueError:
+            shared_cache.set(get_generation_key(key),
+                             time.time_ns(),
+                             None)
+    shared_cache.delete_many([get_shared_key(key) for key in keys])
+
+
+def invalidate_token(key):
+    "Функция отзыва токена во всех кэшах."
+
+    revoke_tokens([key])
+
+
+def invalidate_user_tokens(user):
+    "Функция отзыва всех токенов пользователя во всех кэшах."
+
+    token_cache.delete_user(user.pk)
+    revoke_tokens(list(
+        Token.objects.filter(user=user).values_list('key', flat=True)
+    ))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Аутентификация по токену с кэшированием пары токен -> пользователь
+    в памяти процесса и в общем кэше. Каждая запись помнит поколение
+    токена, прочитанное до загрузки из БД; запись в памяти сверяет его
+    с общим кэшем не чаще раза в CHECK_INTERVAL секунд, поэтому отзыв
+    в другом воркере начинает действовать не позже чем через этот срок,
+    а запросы между сверками не обращаются к общему кэшу."""
+
+    def authenticate_credentials(self, key):
+        now = time.monotonic()
+        check_interval = settings.TOKEN_AUTH_CACHE['CHECK_INTERVAL']
+        entry = token_cache.get(key)
+        if entry is not None and now - entry[2] < check_interval:
+            user, token = entry[1]
+            return copy.copy(user), token
+
+        shared_cache = get_shared_cache()
+        generation_key = get_generation_key(key)
+        if entry is not None:
+            generation = shared_cache.get(generation_key)
+            shared_entry = entry[:2]
+        else:
+            values = shared_cache.get_many([generation_key,
+                                            get_shared_key(key)])
+            generation = values.get(generation_key)
+            shared_entry = values.get(get_shared_key(key))
+
+        if shared_entry is None or shared_entry[0] != generation:
+            shared_entry = (generation, super().authenticate_credentials(key))
+            shared_cache.set(get_shared_key(key),
+                             shared_entry,
+                             settings.TOKEN_AUTH_CACHE['TTL'])
+        if entry is not None and entry[0] == generation:
+            # Срок жизни записи не продлевается: пользователь
+            # перечитывается из БД раз в TTL.
+            entry[2] = now
+        else:
+            token_cache.set(key, [*shared_entry, now])
+
+        user, token = shared_entry[1]
+        return copy.copy(user), token
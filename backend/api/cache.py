@@ -0,0 +1,198 @@
+import gzip
+import hashlib
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from recipes.models import Tag
+
+TAGS_VERSION_KEY = 'tags:version'
+RECIPES_VERSION_KEY = 'recipes:version'
+SNAPSHOT_TIMEOUT = 300
+STALE_GRACE = 30
+REBUILD_LOCK_TIMEOUT = 10
+REBUILD_WAIT = 5
+REBUILD_POLL_INTERVAL = 0.05
+
+
+def get_shared_cache():
+    return caches[settings.SHARED_CACHE]
+
+
+def bump_version(key):
+    shared_cache = get_shared_cache()
+    try:
+        shared_cache.incr(key)
+    except ValueError:
+        shared_cache.set(key, time.time_ns(), None)
+
+
+class VersionedCopy:
+    """Копия значения в памяти процесса, привязанная к версии в общем
+    кэше. Версия сверяется не чаще раза в settings.TAGS_CHECK_INTERVAL
+    секунд; при ее смене значение загружается заново, поэтому изменение
+    в одном воркере видно остальным не позже чем через этот срок."""
+
+    def __init__(self, version_key, load):
+        self.version_key = version_key
+        self.load = load
+        self.state = (None, None, -math.inf)
+
+    def get(self):
+        version, value, checked = self.state
+        now = time.monotonic()
+        if now - checked < settings.TAGS_CHECK_INTERVAL:
+            return value
+        # Версия читается до загрузки: смена версии во время загрузки
+        # приведет к повторной загрузке при следующей сверке.
+        current = get_shared_cache().get_or_set(self.version_key,
+                                                time.time_ns(),
+                                                None)
+        if value is None or current != version:
+            value = self.load()
+        self.state = (current, value, now)
+        return value
+
+    def invalidate(self):
+        bump_version(self.version_key)
+        self.state = (None, None, -math.inf)
+
+
+tag_slug_map = VersionedCopy(
+    TAGS_VERSION_KEY,
+    lambda: dict(Tag.objects.values_list('slug', 'id'))
+)
+
+
+def get_tag_slug_map():
+    "Функция получения соответствия slug -> id тегов."
+
+    return tag_slug_map.get()
+
+
+def invalidate_tag_slug_map():
+    "Функция сброса соответствия slug -> id тегов во всех воркерах."
+
+    tag_slug_map.invalidate()
+
+
+def get_recipes_version():
+    """Функция получения текущей версии данных о рецептах; версия общая
+    для всех воркеров, иначе после записи остальные выдавали бы старые
+    страницы."""
+
+    return get_shared_cache().get_or_set(RECIPES_VERSION_KEY,
+                                         time.time_ns(),
+                                         None)
+
+
+def bump_recipes_version():
+    "Функция инвалидации всех кэшей, зависящих от рецептов."
+
+    bump_version(RECIPES_VERSION_KEY)
+
+
+def make_recipes_cache_key(prefix, query_params, ignored=()):
+    """Функция построения ключа кэша по параметрам запроса; версия
+    рецептов передается в get_or_build, чтобы после изменения данных
+    по тому же ключу оставалось устаревшее значение."""
+
+    params = sorted(
+        (key, value)
+        for key, values in query_params.lists() if key not in ignored
+        for value in values
+    )
+    digest = hashlib.md5(repr(params).encode()).hexdigest()
+    return f'{prefix}:{digest}'
+
+
+def get_or_build(key, build, timeout, version=None, grace=STALE_GRACE):
+    """Функция получения значения из кэша с объединением одновременных
+    перестроений (single-flight) и выдачей устаревшего значения в течение
+    grace секунд, пока его обновляет один запрос (stale-while-revalidate).
+
+    Значение устаревает по истечении timeout или при смене version.
+    Значения и блокировка перестроения хранятся в общем кэше, поэтому
+    значение перестраивает один запрос на все воркеры."""
+
+    shared_cache = get_shared_cache()
+    entry = shared_cache.get(key)
+    if is_fresh(entry, version):
+        return entry['value']
+
+    lock_key = f'{key}:rebuild'
+    if entry is not None and entry['stale_until'] > time.time():
+        if not shared_cache.add(lock_key, True, REBUILD_LOCK_TIMEOUT):
+            return entry['value']
+        return rebuild(key, lock_key, build, timeout, version, grace)
+
+    deadline = time.monotonic() + REBUILD_WAIT
+    while not shared_cache.add(lock_key, True, REBUILD_LOCK_TIMEOUT):
+        time.sleep(REBUILD_POLL_INTERVAL)
+        entry = shared_cache.get(key)
+        if is_fresh(entry, version):
+            return entry['value']
+        if time.monotonic() > deadline:
+            return build()
+    entry = shared_cache.get(key)
+    if is_fresh(entry, version):
+        shared_cache.delete(lock_key)
+        return entry['value']
+    return rebuild(key, lock_key, build, timeout, version, grace)
+
+
+def is_fresh(entry, version):
+    return (entry is not None and entry['version'] == version
+            and entry['fresh_until'] > time.time())
+
+
+def rebuild(key, lock_key, build, timeout, version, grace):
+    shared_cache = get_shared_cache()
+    try:
+        value = build()
+        now = time.time()
+        shared_cache.set(key,
+                         {'value': value,
+                          'version': version,
+                          'fresh_until': now + timeout,
+                          'stale_until': now + timeout + grace},
+                         timeout + grace)
+        return value
+    finally:
+        shared_cache.delete(lock_key)
+
+
+def mark_stale(key, grace=STALE_GRACE):
+    """Функция пометки значения get_or_build устаревшим: оно выдается
+    еще grace секунд, пока не будет перестроено."""
+
+    shared_cache = get_shared_cache()
+    entry = shared_cache.get(key)
+    if entry is not None:
+        entry['fresh_until'] = 0
+        entry['stale_until'] = min(entry['stale_until'], time.time() + grace)
+        shared_cache.set(key, entry, grace)
+
+
+def get_snapshot(name, build):
+    """Функция получения кэшированного JSON-снимка справочника, заранее
+    сжатого, и его ETag. Хранится только сжатая версия: снимок читается
+    из общего кэша на каждый запрос, а клиенты без gzip редки."""
+
+    def build_snapshot():
+        body = build()
+        return {
+            'gzip': gzip.compress(body, compresslevel=9, mtime=0),
+            # Слабый ETag: сжатая и исходная версии равнозначны.
+            'etag': f'W/"{hashlib.md5(body).hexdigest()}"',
+        }
+
+    return get_or_build(f'snapshot:{name}', build_snapshot, SNAPSHOT_TIMEOUT)
+
+
+def invalidate_snapshot(name):
+    "Функция пометки JSON-снимка справочника устаревшим."
+
+    mark_stale(f'snapshot:{name}')
@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.core.checks import Error, register
+
+# Бэкенды, данные которых видит только текущий процесс.
+LOCAL_CACHE_BACKENDS = ('django.core.cache.backends.locmem.LocMemCache',
+                        'django.core.cache.backends.dummy.DummyCache')
+
+
+def get_shared_cache_settings():
+    "Функция получения настроек, которым нужен общий для воркеров кэш."
+
+    return {
+        'IDEMPOTENCY["CACHE"]': settings.IDEMPOTENCY['CACHE'],
+        'THROTTLING["CACHE"]': settings.THROTTLING['CACHE'],
+        'SHARED_CACHE': settings.SHARED_CACHE,
+        'TOKEN_AUTH_CACHE["SHARED_CACHE"]':
+            settings.TOKEN_AUTH_CACHE['SHARED_CACHE'],
+    }
+
+
+def get_local_cache_errors():
+    "Функция поиска общих по смыслу кэшей с локальным бэкендом."
+
+    return [
+        f'{name} uses the process-local cache {alias!r} '
+        f'({settings.CACHES[alias]["BACKEND"]})'
+        for name, alias in get_shared_cache_settings().items()
+        if settings.CACHES[alias]['BACKEND'] in LOCAL_CACHE_BACKENDS
+    ]
+
+
+def ensure_shared_caches(workers):
+    """Функция проверки кэшей перед запуском нескольких воркеров:
+    с локальным кэшем каждый воркер видит только свои записи."""
+
+    errors = get_local_cache_errors()
+    if workers > 1 and errors:
+        raise RuntimeError(f'{workers} workers need a shared cache: '
+                           + '; '.join(errors))
+
+
+@register(deploy=True)
+def check_shared_caches(app_configs, **kwargs):
+    return [Error(error, id='api.E001') for error in get_local_cache_errors()]
@@ -0,0 +1,186 @@
+# Ответы собираются из строк values() без создания моделей и полей DRF;
+# вывод должен совпадать с сериализаторами api.serializers байт в байт
+# (проверяется командой bench_endpoints).
+from operator import itemgetter
+
+from recipes.models import (Favorite,
+                            IngredientRecipe,
+                            Recipe,
+                            ShoppingCart,
+                            Subscribe,
+                            TagRecipe)
+
+from .metrics import timed_serialization
+
+USER_FIELDS = ('id', 'username', 'email', 'first_name', 'last_name')
+RECIPE_CONTEXT_FIELDS = ('id', 'name', 'image', 'cooking_time')
+
+
+def get_image_url_getter(request, key):
+    """Функция построения функции получения абсолютного URL изображения,
+    как у ImageField DRF; URL одинаковых файлов строятся один раз."""
+
+    storage = Recipe._meta.get_field('image').storage
+    urls = {}
+
+    def get_url(row):
+        name = row[key]
+        if not name:
+            return None
+        url = urls.get(name)
+        if url is None:
+            url = urls[name] = request.build_absolute_uri(storage.url(name))
+        return url
+
+    return get_url
+
+
+def get_user_ids(model, request, field, ids):
+    "Функция получения множества id, связанных с текущим пользователем."
+
+    user = request.user
+    if user.is_anonymous or not ids:
+        return set()
+    return set(model.objects.filter(
+        user=user, **{f'{field}__in': ids}
+    ).values_list(field, flat=True))
+
+
+def group_rows(rows, key):
+    "Функция группировки строк values() по значению ключа."
+
+    groups = {}
+    for row in rows:
+        groups.setdefault(row.pop(key), []).append(row)
+    return groups
+
+
+def compile_fields(accessors, fields):
+    "Функция отбора пар (поле, функция) в порядке полей сериализатора."
+
+    return [(name, accessors[name]) for name in fields]
+
+
+def build(rows, accessors):
+    return [{name: get(row) for name, get in accessors} for row in rows]
+
+
+def contains(ids, key):
+    return lambda row: row[key] in ids
+
+
+def get_user_accessors(subscribed, prefix=''):
+    accessors = {name: itemgetter(f'{prefix}{name}') for name in USER_FIELDS}
+    accessors['is_subscribed'] = contains(subscribed, f'{prefix}id')
+    return accessors
+
+
+@timed_serialization()
+def serialize_users(rows, request, fields):
+    "Функция сериализации строк пользователей, как CustomUserSerializer."
+
+    subscribed = get_user_ids(Subscribe, request, 'author',
+                              [row['id'] for row in rows])
+    return build(rows, compile_fields(get_user_accessors(subscribed), fields))
+
+
+def get_recipe_columns(fields):
+    "Функция выбора колонок values() для быстрой сериализации рецептов."
+
+    columns = ['id'] + [field for field in ('name', 'text', 'image',
+                                            'cooking_time')
+                        if field in fields]
+    if 'author' in fields:
+        columns += [f'author__{field}' for field in USER_FIELDS]
+    return columns
+
+
+@timed_serialization()
+def serialize_recipes(rows, request, fields):
+    "Функция сериализации строк рецептов, как RecipeSerializer."
+
+    ids = [row['id'] for row in rows]
+    accessors = {name: itemgetter(name)
+                 for name in ('id', 'name', 'text', 'cooking_time')}
+    accessors['image'] = get_image_url_getter(request, 'image')
+
+    if 'ingredients' in fields:
+        ingredients = group_rows(IngredientRecipe.objects.filter(
+            recipe_id__in=ids
+        ).order_by('ingredient__name').values(
+            'recipe_id',
+            'ingredient__id',
+            'ingredient__name',
+            'ingredient__measurement_unit',
+            'amount'
+        ), 'recipe_id')
+        accessors['ingredients'] = lambda row: [
+            {'id': ingredient['ingredient__id'],
+             'name': ingredient['ingredient__name'],
+             'measurement_unit': ingredient['ingredient__measurement_unit'],
+             'amount': ingredient['amount']}
+            for ingredient in ingredients.get(row['id'], ())
+        ]
+    if 'tags' in fields:
+        tags = group_rows(TagRecipe.objects.filter(
+            recipe_id__in=ids
+        ).order_by('tag__name').values(
+            'recipe_id', 'tag__id', 'tag__name', 'tag__slug', 'tag__color'
+        ), 'recipe_id')
+        accessors['tags'] = lambda row: [
+            {'id': tag['tag__id'],
+             'name': tag['tag__name'],
+             'slug': tag['tag__slug'],
+             'color': tag['tag__color']}
+            for tag in tags.get(row['id'], ())
+        ]
+    if 'author' in fields:
+        subscribed = get_user_ids(Subscribe, request, 'author',
+                                  {row['author__id'] for row in rows})
+        author_accessors = compile_fields(
+            get_user_accessors(subscribed, prefix='author__'),
+            USER_FIELDS + ('is_subscribed',)
+        )
+        accessors['author'] = lambda row: {name: get(row)
+                                           for name, get in author_accessors}
+    for field, model in (('is_favorited', Favorite),
+                         ('is_in_shopping_cart', ShoppingCart)):
+        if field in fields:
+            accessors[field] = contains(
+                get_user_ids(model, request, 'recipe', ids), 'id'
+            )
+
+    return build(rows, compile_fields(accessors, fields))
+
+
+@timed_serialization()
+def serialize_ingredients(queryset):
+    "Функция сериализации ингредиентов, как IngredientSerializer."
+
+    return list(queryset.values('id', 'name', 'measurement_unit'))
+
+
+@timed_serialization()
+def serialize_subscriptions(rows, request, fields):
+    "Функция сериализации авторов, как CustomUserContextSerializer."
+
+    ids = [row['id'] for row in rows]
+    subscribed = get_user_ids(Subscribe, request, 'author', ids)
+    accessors = get_user_accessors(subscribed)
+    accessors['recipes_count'] = itemgetter('recipes_count')
+
+    if 'recipes' in fields:
+        recipes = group_rows(Recipe.objects.filter(
+            author_id__in=ids
+        ).values(*RECIPE_CONTEXT_FIELDS, 'author_id'), 'author_id')
+        recipe_accessors = compile_fields(
+            {'id': itemgetter('id'),
+             'name': itemgetter('name'),
+             'image': get_image_url_getter(request, 'image'),
+             'cooking_time': itemgetter('cooking_time')},
+            RECIPE_CONTEXT_FIELDS
+        )
+        accessors['recipes'] = lambda row: build(recipes.get(row['id'], ()),
+                                                 recipe_accessors)
+
+    return build(rows, compile_fields(accessors, fields))
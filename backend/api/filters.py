@@ -1,9 +1,35 @@
+from django import forms
+from django.db.models import Exists, OuterRef
 from django_filters.rest_framework import (FilterSet,
+                                           BaseInFilter,
                                            BooleanFilter,
                                            CharFilter,
-                                           ModelMultipleChoiceFilter)
+                                           Filter,
+                                           MultipleChoiceFilter)
 
-from recipes.models import Ingredient, Recipe, Tag
+from recipes.models import Ingredient, IngredientRecipe, Recipe, TagRecipe
+from recipes.search import search_recipes
+
+from .cache import get_tag_slug_map
+from .utils import ID_MAX
+
+
+def get_tag_choices():
+    return [(slug, slug) for slug in get_tag_slug_map()]
+
+
+class IdFilter(Filter):
+    "Фильтр по целому id в диапазоне BigAutoField."
+    field_class = forms.IntegerField
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('min_value', 1)
+        kwargs.setdefault('max_value', ID_MAX)
+        super().__init__(*args, **kwargs)
+
+
+class IdInFilter(BaseInFilter, IdFilter):
+    "Фильтр по списку id, переданных через запятую."
 
 
 class IngredientFilterSet(FilterSet):
@@ -17,10 +43,9 @@ class IngredientFilterSet(FilterSet):
 
 class RecipeFilterSet(FilterSet):
 
-    tags = ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all()
+    tags = MultipleChoiceFilter(
+        choices=get_tag_choices,
+        method='tags_filter'
     )
 
     is_favorited = BooleanFilter(
@@ -33,6 +58,12 @@ class RecipeFilterSet(FilterSet):
         method='is_exist_filter'
     )
 
+    search = CharFilter(method='search_filter')
+
+    ingredients = IdInFilter(method='ingredients_filter')
+
+    exclude_ingredients = IdInFilter(method='exclude_ingredients_filter')
+
     class Meta:
         model = Recipe
         fields = ('tags', 'author')
@@ -42,3 +73,31 @@ class RecipeFilterSet(FilterSet):
         if self.request.user.is_anonymous:
             return queryset
         return queryset.filter(**{lookup: self.request.user})
+
+    def search_filter(self, queryset, name, value):
+        return search_recipes(queryset, value)
+
+    def tags_filter(self, queryset, name, value):
+        slug_map = get_tag_slug_map()
+        # Тег могли удалить после проверки выбора: его slug пропускается.
+        tag_ids = [slug_map.get(slug) for slug in value]
+        return queryset.filter(Exists(
+            TagRecipe.objects.filter(
+                tag_id__in=[tag_id for tag_id in tag_ids if tag_id],
+                recipe=OuterRef('pk')
+            )
+        ))
+
+    def ingredients_filter(self, queryset, name, value):
+        for ingredient_id in set(value):
+            queryset = queryset.filter(Exists(
+                IngredientRecipe.objects.filter(recipe=OuterRef('pk'),
+                                                ingredient_id=ingredient_id)
+            ))
+        return queryset
+
+    def exclude_ingredients_filter(self, queryset, name, value):
+        return queryset.filter(~Exists(
+            IngredientRecipe.objects.filter(recipe=OuterRef('pk'),
+                                            ingredient_id__in=value)
+        ))
@@ -0,0 +1,85 @@
+import functools
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import caches
+
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+IDEMPOTENCY_LOCK_TIMEOUT = 60
+
+
+def get_idempotency_cache():
+    return caches[settings.IDEMPOTENCY['CACHE']]
+
+
+def get_fingerprint(request):
+    "Функция получения отпечатка тела запроса."
+
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.md5(body.encode()).hexdigest()
+
+
+def idempotent(view_method):
+    """Декоратор метода вьюсета, поддерживающий заголовок Idempotency-Key:
+    результат первого запроса с ключом хранится IDEMPOTENCY['TTL'] секунд
+    и возвращается на повторы без повторной записи в БД."""
+
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if key is None:
+            return view_method(self, request, *args, **kwargs)
+        if not key or len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+            raise ValidationError({
+                IDEMPOTENCY_HEADER: 'Ключ должен содержать от 1 до '
+                                    f'{IDEMPOTENCY_KEY_MAX_LENGTH} символов'
+            })
+
+        cache = get_idempotency_cache()
+        # Ключ действует только для своего пользователя и эндпоинта.
+        cache_key = 'idempotency:' + hashlib.md5(
+            f'{request.user.pk}:{request.method}:{request.path}:{key}'.encode()
+        ).hexdigest()
+        lock_key = f'{cache_key}:lock'
+        fingerprint = get_fingerprint(request)
+
+        stored = cache.get(cache_key)
+        if stored is None:
+            if not cache.add(lock_key, True, IDEMPOTENCY_LOCK_TIMEOUT):
+                return Response(
+                    data={'errors': 'Запрос с этим ключом идемпотентности '
+                                    'еще выполняется'},
+                    status=status.HTTP_409_CONFLICT
+                )
+            try:
+                stored = cache.get(cache_key)
+                if stored is None:
+                    response = view_method(self, request, *args, **kwargs)
+                    # Ошибки сервера не сохраняются: повтор их исправит.
+                    if response.status_code < 500:
+                        cache.set(cache_key,
+                                  {'fingerprint': fingerprint,
+                                   'data': response.data,
+                                   'status': response.status_code},
+                                  settings.IDEMPOTENCY['TTL'])
+                    return response
+            finally:
+                cache.delete(lock_key)
+
+        if stored['fingerprint'] != fingerprint:
+            return Response(
+                data={'errors': 'Ключ идемпотентности уже использован '
+                                'с другим телом запроса'},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY
+            )
+        return Response(stored['data'],
+                        status=stored['status'],
+                        headers={'Idempotent-Replayed': 'true'})
+
+    return wrapper
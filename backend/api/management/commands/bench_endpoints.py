@@ -0,0 +1,310 @@
+import gc
+import json
+import statistics
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework.authtoken.models import Token
+
+from api.views import CustomUserViewSet, IngredientViewSet, RecipeViewSet
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import CustomUser
+
+DEFAULT_BUDGETS = f'{settings.BASE_DIR}/data/endpoint_budgets.json'
+LATENCY_HEADROOM = 2
+LATENCY_SLACK_MS = 20
+MEMORY_HEADROOM = 1.5
+MEMORY_SLACK_KB = 64
+FAST_SERIALIZATION_VIEWSETS = (CustomUserViewSet,
+                               IngredientViewSet,
+                               RecipeViewSet)
+SPARSE_PATHS = ('/api/recipes/?fields=name,image,cooking_time,tags,author',
+                '/api/recipes/?omit=text,ingredients',
+                '/api/users/?fields=username,is_subscribed',
+                '/api/users/subscriptions/?omit=recipes')
+WIRE_HEADROOM = 1.2
+WIRE_SLACK_KB = 1
+
+
+class Command(BaseCommand):
+    help = ('Benchmark API endpoints (queries, p50/p95 latency, allocated '
+            'memory, bytes on the wire) and check the results against '
+            'stored budgets')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--budgets', default=DEFAULT_BUDGETS)
+        parser.add_argument('--write-budgets', action='store_true',
+                            help='Store measured values with headroom '
+                                 'as the new budgets')
+
+    def unthrottled(self):
+        """Ограничения поднимаются так, чтобы повторы не упирались в них,
+        но проверка корзин токенов оставалась в замерах. Сверки токена
+        с отзывом и тегов с их версией идут раз в интервал, а не на запрос,
+        поэтому в замеры не попадают: иначе число запросов зависело бы
+        от того, на какой повтор пришлась сверка."""
+
+        rates = settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']
+        return override_settings(
+            REST_FRAMEWORK={
+                **settings.REST_FRAMEWORK,
+                'DEFAULT_THROTTLE_RATES': {scope: '1000000/s'
+                                           for scope in rates},
+            },
+            TOKEN_AUTH_CACHE={**settings.TOKEN_AUTH_CACHE,
+                              'CHECK_INTERVAL': float('inf')},
+            TAGS_CHECK_INTERVAL=float('inf')
+        )
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 2:
+            raise CommandError('--repeat must be at least 2')
+
+        with transaction.atomic(), self.unthrottled():
+            groups = self.get_endpoint_groups(self.get_user())
+            self.check_fast_serialization(groups)
+            results = self.run_benchmarks(groups, options['repeat'])
+            transaction.set_rollback(True)
+
+        self.print_results(results)
+
+        if options['write_budgets']:
+            self.write_budgets(options['budgets'], results)
+            return
+
+        violations = self.check_budgets(options['budgets'], results)
+        if violations:
+            raise CommandError('Budgets exceeded:\n' + '\n'.join(violations))
+        self.stdout.write(self.style.SUCCESS('All endpoints within budget'))
+
+    def get_user(self):
+        user = CustomUser.objects.filter(
+            favorite_recipes__isnull=False,
+            shopping_carts__isnull=False,
+            subscriptions__isnull=False
+        ).first() or CustomUser.objects.first()
+        if user is None or not Recipe.objects.exists():
+            raise CommandError('No data found, run generate_dataset first')
+        return user
+
+    def get_endpoint_groups(self, user):
+        "Группы запросов; запросы группы выполняются по очереди за проход."
+
+        anonymous = Client(HTTP_ACCEPT_ENCODING='gzip')
+        token, _ = Token.objects.get_or_create(user=user)
+        authorized = Client(HTTP_AUTHORIZATION=f'Token {token.key}',
+                            HTTP_ACCEPT_ENCODING='gzip')
+
+        recipe = Recipe.objects.first()
+        tag = Tag.objects.first()
+        ingredient = Ingredient.objects.first()
+        toggled_recipe = Recipe.objects.exclude(
+            in_favorite_for_users__user=user
+        ).exclude(in_shopping_cart_for_users__user=user).first()
+        favorite_ids = ','.join(str(pk) for pk in Recipe.objects.filter(
+            in_favorite_for_users__user=user
+        ).values_list('pk', flat=True)[:20])
+        author = CustomUser.objects.exclude(pk=user.pk).exclude(
+            subscribers__user=user
+        ).first()
+        # Фильтр собран по избранному рецепту, чтобы страница была не пуста.
+        favorite = Recipe.objects.filter(
+            in_favorite_for_users__user=user, tags__isnull=False
+        ).first() or recipe
+        favorite_tag = favorite.tags.first() or tag
+
+        groups = [
+            [('recipes_list_anonymous', anonymous, 'get', '/api/recipes/')],
+            [('recipes_list', authorized, 'get', '/api/recipes/')],
+            [('recipes_list_filtered', authorized, 'get',
+              f'/api/recipes/?tags={favorite_tag.slug}'
+              f'&author={favorite.author_id}&is_favorited=1')],
+            [('recipes_list_search', anonymous, 'get',
+              f'/api/recipes/?search={recipe.name.split()[0]}')],
+            [('recipes_list_facets', anonymous, 'get',
+              '/api/recipes/?facets=1')],
+            [('recipes_detail', authorized, 'get',
+              f'/api/recipes/{recipe.pk}/')],
+            [('recipes_batch', authorized, 'get',
+              f'/api/recipes/?ids={favorite_ids}')],
+            [('recipes_similar', anonymous, 'get',
+              f'/api/recipes/{recipe.pk}/similar/')],
+            [('download_shopping_cart', authorized, 'get',
+              '/api/recipes/download_shopping_cart/')],
+            [('tags_list', anonymous, 'get', '/api/tags/')],
+            [('ingredients_list', anonymous, 'get', '/api/ingredients/')],
+            [('tags_detail', anonymous, 'get', f'/api/tags/{tag.pk}/')],
+            [('ingredients_search', anonymous, 'get',
+              f'/api/ingredients/?name={ingredient.name[:2]}')],
+            [('users_list', authorized, 'get', '/api/users/')],
+            [('users_detail', authorized, 'get', f'/api/users/{user.pk}/')],
+            [('users_me', authorized, 'get', '/api/users/me/')],
+            [('subscriptions', authorized, 'get',
+              '/api/users/subscriptions/')],
+        ]
+        if toggled_recipe is not None:
+            for relation in ('favorite', 'shopping_cart'):
+                path = f'/api/recipes/{toggled_recipe.pk}/{relation}/'
+                groups.append([
+                    (f'{relation}_add', authorized, 'post', path),
+                    (f'{relation}_remove', authorized, 'delete', path),
+                ])
+        if author is not None:
+            path = f'/api/users/{author.pk}/subscribe/'
+            groups.append([
+                ('subscribe_add', authorized, 'post', path),
+                ('subscribe_remove', authorized, 'delete', path),
+            ])
+        return groups
+
+    def request(self, client, method, path, **extra):
+        response = getattr(client, method)(path, **extra)
+        if response.status_code >= 400:
+            raise CommandError(
+                f'{method.upper()} {path}: status {response.status_code}'
+            )
+        return response
+
+    def get_size_kb(self, response):
+        if response.streaming:
+            size = sum(len(chunk) for chunk in response.streaming_content)
+        else:
+            size = len(response.content)
+        return round(size / 1024, 1)
+
+    def check_fast_serialization(self, groups):
+        """Сверка ответов быстрой сериализации списков с ответами
+        сериализаторов DRF байт в байт."""
+
+        requests = [(path, client)
+                    for group in groups
+                    for _, client, method, path in group if method == 'get']
+        authorized = groups[1][0][1]
+        requests += [(path, authorized) for path in SPARSE_PATHS]
+
+        mismatches = []
+        for path, client in requests:
+            responses = []
+            for fast in (True, False):
+                # Снимки и страницы для анонимов собраны другим вариантом.
+                caches[settings.SHARED_CACHE].clear()
+                for viewset in FAST_SERIALIZATION_VIEWSETS:
+                    viewset.fast_serialization = fast
+                try:
+                    responses.append(self.request(
+                        client, 'get', path, HTTP_ACCEPT_ENCODING='identity'
+                    ).content)
+                finally:
+                    for viewset in FAST_SERIALIZATION_VIEWSETS:
+                        viewset.fast_serialization = True
+            if responses[0] != responses[1]:
+                mismatches.append(path)
+
+        if mismatches:
+            raise CommandError('Fast serialization differs from serializers '
+                               'for:\n' + '\n'.join(mismatches))
+        self.stdout.write(f'Fast serialization matches serializers '
+                          f'({len(requests)} requests)')
+
+    def run_benchmarks(self, groups, repeat):
+        results = {}
+
+        for group in groups:
+            for name, *_ in group:
+                results[name] = {'timings': [], 'queries': 0}
+
+            # Прогревочный проход: первый запрос заполняет кэши; сборка
+            # мусора после предыдущей группы не должна попадать в замеры.
+            for name, client, method, path in group:
+                self.request(client, method, path)
+            gc.collect()
+
+            for _ in range(repeat):
+                for name, client, method, path in group:
+                    with CaptureQueriesContext(connection) as queries:
+                        started = time.perf_counter()
+                        self.request(client, method, path)
+                        elapsed = time.perf_counter() - started
+                    results[name]['timings'].append(elapsed * 1000)
+                    results[name]['queries'] = max(results[name]['queries'],
+                                                   len(queries))
+
+            tracemalloc.start()
+            for name, client, method, path in group:
+                tracemalloc.reset_peak()
+                snapshot_size = tracemalloc.get_traced_memory()[0]
+                response = self.request(client, method, path)
+                results[name]['memory_kb'] = round(
+                    (tracemalloc.get_traced_memory()[1] - snapshot_size)
+                    / 1024
+                )
+                results[name]['wire_kb'] = self.get_size_kb(response)
+            tracemalloc.stop()
+
+            for name, client, method, path in group:
+                response = self.request(client, method, path,
+                                        HTTP_ACCEPT_ENCODING='identity')
+                results[name]['raw_kb'] = self.get_size_kb(response)
+
+        for result in results.values():
+            timings = result.pop('timings')
+            result['p50_ms'] = round(statistics.median(timings), 2)
+            result['p95_ms'] = round(statistics.quantiles(timings, n=20)[-1],
+                                     2)
+        return results
+
+    def print_results(self, results):
+        self.stdout.write(f'{"endpoint":28} queries   p50 ms   p95 ms  '
+                          f'memory KB   wire KB    raw KB')
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:28} {result["queries"]:7} {result["p50_ms"]:8.2f} '
+                f'{result["p95_ms"]:8.2f} {result["memory_kb"]:10} '
+                f'{result["wire_kb"]:9} {result["raw_kb"]:9}'
+            )
+        wire = sum(result['wire_kb'] for result in results.values())
+        raw = sum(result['raw_kb'] for result in results.values())
+        self.stdout.write(f'Bytes on the wire: {wire:.1f} KB of {raw:.1f} KB '
+                          f'uncompressed ({1 - wire / raw:.1%} saved)')
+
+    def write_budgets(self, path, results):
+        budgets = {
+            name: {
+                'queries': result['queries'],
+                'p95_ms': round(max(result['p95_ms'] * LATENCY_HEADROOM,
+                                    result['p95_ms'] + LATENCY_SLACK_MS), 1),
+                'memory_kb': round(max(result['memory_kb'] * MEMORY_HEADROOM,
+                                       result['memory_kb'] + MEMORY_SLACK_KB)),
+                'wire_kb': round(max(result['wire_kb'] * WIRE_HEADROOM,
+                                     result['wire_kb'] + WIRE_SLACK_KB), 1),
+            }
+            for name, result in results.items()
+        }
+        with open(path, 'w', encoding='utf-8') as budgets_file:
+            json.dump(budgets, budgets_file, indent=4)
+            budgets_file.write('\n')
+        self.stdout.write(self.style.SUCCESS(f'Budgets written to {path}'))
+
+    def check_budgets(self, path, results):
+        with open(path, encoding='utf-8') as budgets_file:
+            budgets = json.load(budgets_file)
+
+        violations = []
+        for name, result in results.items():
+            if name not in budgets:
+                violations.append(f'{name}: no budget defined')
+                continue
+            for metric, limit in budgets[name].items():
+                if result[metric] > limit:
+                    violations.append(
+                        f'{name}: {metric} {result[metric]} > {limit}'
+                    )
+        return violations
@@ -0,0 +1,50 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+
+
+class Command(BaseCommand):
+    help = ('Compare per-request overhead of the lean API middleware path '
+            'with the flat browser middleware stack')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/tags/')
+        parser.add_argument('--repeat', type=int, default=2000)
+
+    def get_flat_middleware(self):
+        middleware = []
+        for path in settings.MIDDLEWARE:
+            if path == 'api.middleware.BrowserMiddleware':
+                middleware.extend(settings.BROWSER_MIDDLEWARE)
+            else:
+                middleware.append(path)
+        return middleware
+
+    def timed_get(self, client, path):
+        started = time.perf_counter()
+        client.get(path)
+        return (time.perf_counter() - started) * 1000000
+
+    def handle(self, *args, **options):
+        path, repeat = options['path'], options['repeat']
+
+        lean_client, flat_client = Client(), Client()
+        lean_client.get(path)
+        with override_settings(MIDDLEWARE=self.get_flat_middleware()):
+            # Клиент загружает цепочку middleware при первом запросе.
+            flat_client.get(path)
+
+        lean_timings, flat_timings = [], []
+        for _ in range(repeat):
+            lean_timings.append(self.timed_get(lean_client, path))
+            flat_timings.append(self.timed_get(flat_client, path))
+        lean = statistics.median(lean_timings)
+        flat = statistics.median(flat_timings)
+
+        self.stdout.write(f'{path}: flat stack {flat:.0f} us, '
+                          f'lean API path {lean:.0f} us, '
+                          f'saved {flat - lean:.0f} us per request '
+                          f'({(flat - lean) / flat:.1%})')
@@ -0,0 +1,108 @@
+import os
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from django.core.management.base import BaseCommand, CommandError
+
+DEFAULT_PATHS = ('/api/recipes/', '/api/tags/', '/api/ingredients/?name=а')
+
+
+def get_rss_kb(pid):
+    "Функция подсчета памяти (VmRSS) процесса и его потомков."
+
+    total = 0
+    pids = [pid]
+    while pids:
+        current = pids.pop()
+        try:
+            with open(f'/proc/{current}/status') as status:
+                for line in status:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1])
+            with open(f'/proc/{current}/task/{current}/children') as children:
+                pids.extend(int(child) for child in children.read().split())
+        except FileNotFoundError:
+            continue
+    return total
+
+
+class Command(BaseCommand):
+    help = ('Load test a running server with concurrent clients and report '
+            'throughput, latency and server memory')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000')
+        parser.add_argument('--path', action='append', dest='paths',
+                            help='Path to request, may be repeated')
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument('--duration', type=float, default=30)
+        parser.add_argument('--token', help='Authorization token')
+        parser.add_argument('--server-pid', type=int,
+                            help='Master process of the server to measure '
+                                 'resident memory for')
+
+    def handle(self, *args, **options):
+        if options['concurrency'] < 1:
+            raise CommandError('--concurrency must be positive')
+        if (options['server_pid']
+                and not os.path.exists(f'/proc/{options["server_pid"]}')):
+            raise CommandError(f'No process {options["server_pid"]}')
+
+        urls = [options['url'].rstrip('/')
+                + urllib.parse.quote(path, safe='/?=&')
+                for path in options['paths'] or DEFAULT_PATHS]
+        headers = {}
+        if options['token']:
+            headers['Authorization'] = f'Token {options["token"]}'
+
+        deadline = time.monotonic() + options['duration']
+        timings, errors, memory = [], [], []
+        lock = threading.Lock()
+
+        def client(offset):
+            index = offset
+            while time.monotonic() < deadline:
+                request = urllib.request.Request(urls[index % len(urls)],
+                                                 headers=headers)
+                index += 1
+                started = time.perf_counter()
+                try:
+                    with urllib.request.urlopen(request, timeout=30) as resp:
+                        resp.read()
+                except (urllib.error.URLError, OSError) as error:
+                    with lock:
+                        errors.append(error)
+                    continue
+                elapsed = (time.perf_counter() - started) * 1000
+                with lock:
+                    timings.append(elapsed)
+
+        threads = [threading.Thread(target=client, args=(offset,))
+                   for offset in range(options['concurrency'])]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        while any(thread.is_alive() for thread in threads):
+            if options['server_pid']:
+                memory.append(get_rss_kb(options['server_pid']))
+            time.sleep(0.5)
+        elapsed = time.monotonic() - started
+
+        if len(timings) < 2:
+            raise CommandError(f'Too few successful requests ({len(timings)}'
+                               f', {len(errors)} errors)')
+        self.stdout.write(
+            f'{len(timings)} requests, {len(errors)} errors in {elapsed:.1f} '
+            f's: {len(timings) / elapsed:.1f} rps, '
+            f'p50 {statistics.median(timings):.1f} ms, '
+            f'p95 {statistics.quantiles(timings, n=20)[-1]:.1f} ms'
+        )
+        if memory:
+            peak_mb = max(memory) / 1024
+            self.stdout.write(f'server RSS peak {peak_mb:.0f} MB, '
+                              f'{len(timings) / elapsed / peak_mb:.2f} rps '
+                              f'per MB')
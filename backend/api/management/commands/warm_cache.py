@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from api.warmup import warm_up
+
+
+class Command(BaseCommand):
+    help = ('Warm reference snapshots, the first recipe list pages, the URL '
+            'resolver and serializers, and report the time taken')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int,
+                            help='Recipe list pages per tag combination')
+        parser.add_argument('--url',
+                            help='Public site URL, its host is part of '
+                                 'cache keys')
+
+    def handle(self, *args, **options):
+        report = warm_up(pages=options['pages'], url=options['url'])
+        for name, count, seconds in report:
+            self.stdout.write(
+                f'{name:<22}{count:>6}{seconds * 1000:>10.1f} ms'
+            )
+        total = sum(seconds for _, _, seconds in report)
+        self.stdout.write(f'Warmed up in {total * 1000:.1f} ms')
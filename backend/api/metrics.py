@@ -0,0 +1,137 @@
+import contextlib
+import os
+import threading
+import time
+
+from bisect import bisect_left
+from contextvars import ContextVar
+
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+METRICS = ('total', 'db', 'app', 'serialize', 'render')
+
+current_timings = ContextVar('current_timings', default=None)
+
+
+def start_timings():
+    "Функция начала замеров для текущего запроса."
+
+    timings = {'started': time.perf_counter(),
+               'db': 0.0,
+               'db_queries': 0,
+               'serialize': 0.0,
+               'serializing': False,
+               'render': 0.0}
+    return timings, current_timings.set(timings)
+
+
+def record_query(execute, sql, params, many, context):
+    "Обертка выполнения SQL, учитывающая запросы в замерах запроса."
+
+    timings = current_timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings['db'] += (time.perf_counter() - started) * 1000
+        timings['db_queries'] += 1
+
+
+@contextlib.contextmanager
+def timed_serialization():
+    """Контекстный менеджер учета времени сериализации в замерах запроса.
+    Запросы к БД внутри сериализации остаются в замере db, вложенные
+    сериализаторы учитываются внешним."""
+
+    timings = current_timings.get()
+    if timings is None or timings['serializing']:
+        yield
+        return
+    timings['serializing'] = True
+    started, db = time.perf_counter(), timings['db']
+    try:
+        yield
+    finally:
+        timings['serialize'] += max(
+            (time.perf_counter() - started) * 1000 - (timings['db'] - db), 0.0
+        )
+        timings['serializing'] = False
+
+
+class Histogram:
+    "Гистограмма длительностей с фиксированными границами корзин."
+
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(BUCKETS_MS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class RequestMetrics:
+    "Хранилище гистограмм по маршрутам в пределах процесса."
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.queries = {}
+
+    def record(self, view, method, status, timings):
+        with self.lock:
+            for metric in METRICS:
+                key = (view, method, metric)
+                histogram = self.histograms.get(key)
+                if histogram is None:
+                    histogram = self.histograms[key] = Histogram()
+                histogram.observe(timings[metric])
+            key = (view, method, status)
+            self.queries[key] = (self.queries.get(key, 0)
+                                 + timings['db_queries'])
+
+    def render_prometheus(self):
+        "Метод выгрузки метрик в текстовом формате Prometheus."
+
+        worker = os.getpid()
+        lines = [
+            '# HELP foodgram_request_duration_ms Request phase duration.',
+            '# TYPE foodgram_request_duration_ms histogram',
+        ]
+        with self.lock:
+            histograms = sorted(self.histograms.items())
+            queries = sorted(self.queries.items())
+
+        for (view, method, metric), histogram in histograms:
+            labels = (f'view="{view}",method="{method}",'
+                      f'phase="{metric}",worker="{worker}"')
+            cumulative = 0
+            for bound, count in zip(BUCKETS_MS + ('+Inf',),
+                                    histogram.counts):
+                cumulative += count
+                lines.append(f'foodgram_request_duration_ms_bucket'
+                             f'{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'foodgram_request_duration_ms_sum{{{labels}}} '
+                         f'{histogram.sum:.3f}')
+            lines.append(f'foodgram_request_duration_ms_count{{{labels}}} '
+                         f'{histogram.count}')
+
+        lines += [
+            '# HELP foodgram_db_queries_total SQL queries run by requests.',
+            '# TYPE foodgram_db_queries_total counter',
+        ]
+        for (view, method, status), count in queries:
+            lines.append(
+                f'foodgram_db_queries_total{{view="{view}",'
+                f'method="{method}",status="{status}",worker="{worker}"}} '
+                f'{count}'
+            )
+        return '\n'.join(lines) + '\n'
+
+
+request_metrics = RequestMetrics()
@@ -0,0 +1,457 @@
+import asyncio
+import cProfile
+import io
+import logging
+import pstats
+import re
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+
+from collections import Counter
+from contextlib import ExitStack
+from pathlib import Path
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.handlers.exception import convert_exception_to_response
+from django.db import connections
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.module_loading import import_string
+from django.utils.text import compress_string
+
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+
+from backend.db_router import use_primary
+
+from . import renderers
+from .metrics import current_timings, request_metrics, start_timings
+from .utils import ACCEPTS_GZIP
+
+logger = logging.getLogger('api.queries')
+
+IN_CLAUSE = re.compile(r'IN \((?:%s, )*%s\)')
+
+
+class NPlusOneError(Exception):
+    "Исключение при обнаружении повторяющихся запросов (N+1)."
+
+
+class HybridMiddleware:
+    """Базовый middleware, работающий как в WSGI, так и в ASGI-режиме:
+    наследники реализуют handle() и асинхронный handle_async()."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # По этому маркеру Django распознает асинхронный middleware.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+            self.sync_get_response = async_to_sync(get_response)
+        else:
+            self.sync_get_response = get_response
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.handle_async(request)
+        return self.handle(request)
+
+
+class BrowserMiddleware(HybridMiddleware):
+    """Middleware-группа для браузерных страниц (сессии, CSRF, сообщения,
+    кликджекинг). Запросы к API с токен-аутентификацией ее пропускают."""
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.middleware = []
+
+        handler = self.sync_get_response
+        for middleware_path in reversed(settings.BROWSER_MIDDLEWARE):
+            try:
+                middleware = import_string(middleware_path)(handler)
+            except MiddlewareNotUsed:
+                continue
+            self.middleware.insert(0, middleware)
+            handler = convert_exception_to_response(middleware)
+        self.browser_handler = handler
+        self.async_browser_handler = sync_to_async(handler)
+
+        self.view_hooks = [
+            middleware.process_view for middleware in self.middleware
+            if hasattr(middleware, 'process_view')
+        ]
+        self.template_response_hooks = [
+            middleware.process_template_response
+            for middleware in reversed(self.middleware)
+            if hasattr(middleware, 'process_template_response')
+        ]
+        self.exception_hooks = [
+            middleware.process_exception
+            for middleware in reversed(self.middleware)
+            if hasattr(middleware, 'process_exception')
+        ]
+
+    def is_api_request(self, request):
+        return request.path_info.startswith(settings.API_PATH_PREFIX)
+
+    def handle(self, request):
+        if self.is_api_request(request):
+            return self.get_response(request)
+        return self.browser_handler(request)
+
+    async def handle_async(self, request):
+        if self.is_api_request(request):
+            return await self.get_response(request)
+        return await self.async_browser_handler(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if self.is_api_request(request):
+            return None
+        for hook in self.view_hooks:
+            response = hook(request, view_func, view_args, view_kwargs)
+            if response is not None:
+                return response
+        return None
+
+    def process_template_response(self, request, response):
+        if not self.is_api_request(request):
+            for hook in self.template_response_hooks:
+                response = hook(request, response)
+        return response
+
+    def process_exception(self, request, exception):
+        if self.is_api_request(request):
+            return None
+        for hook in self.exception_hooks:
+            response = hook(request, exception)
+            if response is not None:
+                return response
+        return None
+
+
+class ServerTimingMiddleware(HybridMiddleware):
+    """Middleware замера времени запросов к БД, работы представления,
+    сериализации и рендеринга с выдачей заголовка Server-Timing."""
+
+    def handle(self, request):
+        timings, token = start_timings()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        return self.finish(request, response, timings)
+
+    async def handle_async(self, request):
+        timings, token = start_timings()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        return self.finish(request, response, timings)
+
+    def finish(self, request, response, timings):
+        timings['total'] = (time.perf_counter() - timings['started']) * 1000
+        timings['app'] = max(timings['total']
+                             - timings['db']
+                             - timings['serialize']
+                             - timings['render'], 0.0)
+        response['Server-Timing'] = (
+            f'db;dur={timings["db"]:.2f};'
+            f'desc="{timings["db_queries"]} queries", '
+            f'app;dur={timings["app"]:.2f};desc="view and middleware", '
+            f'serialize;dur={timings["serialize"]:.2f}, '
+            f'render;dur={timings["render"]:.2f}, '
+            f'total;dur={timings["total"]:.2f}'
+        )
+
+        resolver_match = request.resolver_match
+        request_metrics.record(
+            resolver_match.view_name if resolver_match else 'unmatched',
+            request.method,
+            response.status_code,
+            timings
+        )
+        return response
+
+
+class CompressionMiddleware(HybridMiddleware):
+    """Middleware сжатия ответов gzip: только типы из списка разрешенных
+    и только тела больше порогового размера."""
+
+    def handle(self, request):
+        return self.compress(request, self.get_response(request))
+
+    async def handle_async(self, request):
+        return self.compress(request, await self.get_response(request))
+
+    def compress(self, request, response):
+        config = settings.COMPRESSION
+        content_type = response.get('Content-Type', '').split(';')[0]
+        if (response.streaming
+                or response.has_header('Content-Encoding')
+                or content_type not in config['CONTENT_TYPES']):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        accept_encoding = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        if (len(response.content) < config['MIN_SIZE']
+                or not ACCEPTS_GZIP.search(accept_encoding)):
+            return response
+
+        compressed = compress_string(response.content)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = 'gzip'
+        if response.has_header('ETag'):
+            response['ETag'] = re.sub(r'^"', 'W/"', response['ETag'])
+        return response
+
+
+class ReplicaRoutingMiddleware(HybridMiddleware):
+    """Middleware выбора БД: безопасные запросы читают с реплик, запись
+    и запросы клиента в течение короткого окна после нее - с основной БД.
+    Окно хранится в подписанной cookie с временем записи: проверка не
+    обращается ни к БД, ни к кэшу, а ответ записи может прийти в любой
+    воркер."""
+    pin_cookie = 'db_pin'
+
+    def is_pinned(self, request):
+        return request.get_signed_cookie(
+            self.pin_cookie,
+            default=None,
+            salt=self.pin_cookie,
+            max_age=settings.REPLICA_PIN_SECONDS
+        ) is not None
+
+    def pin(self, request, response):
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            response.set_signed_cookie(
+                self.pin_cookie,
+                '1',
+                salt=self.pin_cookie,
+                max_age=settings.REPLICA_PIN_SECONDS,
+                secure=request.is_secure(),
+                httponly=True,
+                samesite='Lax'
+            )
+        return response
+
+    def handle(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+        token = use_primary.set(request.method not in SAFE_METHODS
+                                or self.is_pinned(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            use_primary.reset(token)
+        return self.pin(request, response)
+
+    async def handle_async(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return await self.get_response(request)
+        token = use_primary.set(request.method not in SAFE_METHODS
+                                or self.is_pinned(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            use_primary.reset(token)
+        return self.pin(request, response)
+
+
+class QueryInspectorMiddleware:
+    """Middleware для разработки: ищет повторяющиеся запросы из одного
+    места кода (N+1) и логирует медленные запросы."""
+
+    def __init__(self, get_response):
+        if not settings.QUERY_INSPECTOR['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.project_dir = str(settings.BASE_DIR)
+
+    def __call__(self, request):
+        queries = Counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(
+                    lambda *args: self.inspect_query(queries, *args)
+                ))
+            response = self.get_response(request)
+
+        config = settings.QUERY_INSPECTOR
+        repeated = [
+            (count, call_site, template)
+            for (template, call_site), count in queries.items()
+            if count >= config['N_PLUS_ONE_THRESHOLD']
+        ]
+        for count, call_site, template in repeated:
+            logger.warning('Possible N+1 in %s %s: %d queries from %s: %s',
+                           request.method, request.path,
+                           count, call_site, template)
+        if repeated and config['RAISE']:
+            raise NPlusOneError(
+                f'{len(repeated)} repeated query shapes in '
+                f'{request.method} {request.path}'
+            )
+        return response
+
+    def inspect_query(self, queries, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = (time.perf_counter() - started) * 1000
+            call_site = self.get_call_site()
+            queries[(IN_CLAUSE.sub('IN (...)', sql), call_site)] += 1
+            if duration >= settings.QUERY_INSPECTOR['SLOW_QUERY_MS']:
+                logger.warning('Slow query (%.1f ms) from %s: %s',
+                               duration, call_site, sql)
+
+    def get_call_site(self):
+        frame = sys._getframe(1)
+        while frame.f_code.co_filename == __file__:
+            frame = frame.f_back
+        while frame is not None and frame.f_code.co_filename != __file__:
+            filename = frame.f_code.co_filename
+            if (filename.startswith(self.project_dir)
+                    and 'site-packages' not in filename
+                    and filename != renderers.__file__):
+                return (f'{filename[len(self.project_dir) + 1:]}:'
+                        f'{frame.f_lineno} in {frame.f_code.co_name}')
+            frame = frame.f_back
+        return 'lazy queryset evaluated during rendering'
+
+
+class ProfilingMiddleware(HybridMiddleware):
+    """Middleware профилирования отдельного запроса сотрудника по флагу
+    в заголовке X-Profile или параметре _profile. Профилируемые запросы
+    процесса выполняются по одному."""
+    lock = threading.Lock()
+
+    def is_flagged(self, request):
+        return ('HTTP_X_PROFILE' in request.META
+                or '_profile' in request.META.get('QUERY_STRING', ''))
+
+    def handle(self, request):
+        if not self.is_flagged(request):
+            return self.get_response(request)
+        return self.handle_flagged(request)
+
+    async def handle_async(self, request):
+        if not self.is_flagged(request):
+            return await self.get_response(request)
+        return await sync_to_async(self.handle_flagged)(request)
+
+    def handle_flagged(self, request):
+        flag = request.META.get('HTTP_X_PROFILE') or request.GET.get(
+            '_profile'
+        )
+        user = self.get_staff_user(request) if flag else None
+        if flag not in ('1', 'text') or user is None:
+            return self.sync_get_response(request)
+        if not self.allow(user):
+            response = self.sync_get_response(request)
+            response['X-Profile'] = 'rate-limited'
+            return response
+        # Второй профилировщик исказил бы замеры первого, а ждать его
+        # окончания нельзя: запрос занял бы поток воркера.
+        if not self.lock.acquire(blocking=False):
+            response = self.sync_get_response(request)
+            response['X-Profile'] = 'busy'
+            return response
+        try:
+            return self.profile(request, user, flag)
+        finally:
+            self.lock.release()
+
+    def get_staff_user(self, request):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_staff:
+            return user
+        authentication_classes = api_settings.DEFAULT_AUTHENTICATION_CLASSES
+        for authentication_class in authentication_classes:
+            try:
+                result = authentication_class().authenticate(request)
+            except AuthenticationFailed:
+                return None
+            if result is not None:
+                return result[0] if result[0].is_staff else None
+        return None
+
+    def allow(self, user):
+        # Счетчик общий для всех воркеров, иначе лимит умножится на их число.
+        cache = caches[settings.SHARED_CACHE]
+        key = f'profiling:{user.pk}:{int(time.time() // 60)}'
+        cache.add(key, 0, 60)
+        try:
+            count = cache.incr(key)
+        except ValueError:
+            count = 1
+        return count <= settings.PROFILING['RATE_PER_MINUTE']
+
+    def remove_old_dumps(self, profile_dir):
+        "Метод удаления самых старых профилей сверх PROFILING['MAX_DUMPS']."
+
+        dumps = sorted(profile_dir.glob('*.prof'),
+                       key=lambda path: path.stat().st_mtime,
+                       reverse=True)
+        for dump in dumps[settings.PROFILING['MAX_DUMPS']:]:
+            dump.unlink(missing_ok=True)
+            dump.with_suffix('.txt').unlink(missing_ok=True)
+
+    def profile(self, request, user, flag):
+        trace_allocations = settings.PROFILING['TRACE_ALLOCATIONS']
+        started_tracing = trace_allocations and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        baseline = tracemalloc.take_snapshot() if trace_allocations else None
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            response = self.sync_get_response(request)
+        finally:
+            profiler.disable()
+            allocations = []
+            if trace_allocations:
+                allocations = tracemalloc.take_snapshot().compare_to(
+                    baseline, 'lineno'
+                )
+            if started_tracing:
+                tracemalloc.stop()
+
+        summary = io.StringIO()
+        summary.write(f'{request.method} {request.get_full_path()}\n\n')
+        pstats.Stats(profiler, stream=summary).sort_stats(
+            'cumulative'
+        ).print_stats(settings.PROFILING['TOP_FUNCTIONS'])
+        if trace_allocations:
+            summary.write('Top allocations (all threads of the worker):\n')
+            for stat in allocations[:settings.PROFILING['TOP_ALLOCATIONS']]:
+                summary.write(f'{stat}\n')
+
+        profile_dir = Path(settings.PROFILING['DIR'])
+        profile_dir.mkdir(parents=True, exist_ok=True)
+        profile_id = (f'{time.strftime("%Y%m%d-%H%M%S")}-{user.pk}-'
+                      f'{uuid.uuid4().hex[:8]}')
+        profiler.dump_stats(profile_dir / f'{profile_id}.prof')
+        (profile_dir / f'{profile_id}.txt').write_text(summary.getvalue(),
+                                                       encoding='utf-8')
+        self.remove_old_dumps(profile_dir)
+
+        if flag == 'text':
+            response = HttpResponse(summary.getvalue(),
+                                    content_type='text/plain; charset=utf-8')
+        response['X-Profile'] = profile_id
+        return response
@@ -0,0 +1,17 @@
+import time
+
+from rest_framework.renderers import JSONRenderer
+
+from .metrics import current_timings
+
+
+class TimedJSONRenderer(JSONRenderer):
+    "JSON-рендерер с учетом времени рендеринга в метриках запроса."
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        started = time.perf_counter()
+        rendered = super().render(data, accepted_media_type, renderer_context)
+        timings = current_timings.get()
+        if timings is not None:
+            timings['render'] += (time.perf_counter() - started) * 1000
+        return rendered
@@ -17,8 +17,11 @@ from recipes.models import (Ingredient,
                             IngredientRecipe,
                             Tag)
 
+from recipes.tasks import schedule_signature_update
+
 from users.models import CustomUser
 
+from .metrics import timed_serialization
 from .utils import get_validated_ingredients, get_validated_tags
 
 
@@ -36,7 +39,27 @@ class Hex2NameColor(serializers.Field):
         return data
 
 
-class RecipeContextSerializer(serializers.ModelSerializer):
+class TimedSerializerMixin:
+    """Миксин сериализатора, учитывающий время вывода объектов в замере
+    serialize заголовка Server-Timing."""
+
+    def to_representation(self, instance):
+        with timed_serialization():
+            return super().to_representation(instance)
+
+
+class SparseFieldsetSerializerMixin:
+    "Миксин сериализатора, оставляющий в ответе только переданные поля."
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class RecipeContextSerializer(TimedSerializerMixin,
+                              serializers.ModelSerializer):
     "Сериализатор для отображения профиля рецепта в других контекстах."
 
     class Meta:
@@ -47,7 +70,9 @@ class RecipeContextSerializer(serializers.ModelSerializer):
                   'cooking_time')
 
 
-class CustomUserSerializer(UserSerializer):
+class CustomUserSerializer(TimedSerializerMixin,
+                           SparseFieldsetSerializerMixin,
+                           UserSerializer):
     "Кастомный сериализатор для пользователей."
     is_subscribed = serializers.SerializerMethodField()
 
@@ -67,7 +92,7 @@ class CustomUserSerializer(UserSerializer):
         return user.subscriptions.filter(author=author).exists()
 
 
-class RegisterUserSerializer(UserCreateSerializer):
+class RegisterUserSerializer(TimedSerializerMixin, UserCreateSerializer):
     "Кастомный сериализатор для регистрации пользователя."
 
     class Meta:
@@ -93,7 +118,9 @@ class RegisterUserSerializer(UserCreateSerializer):
         return data
 
 
-class CustomUserContextSerializer(UserSerializer):
+class CustomUserContextSerializer(TimedSerializerMixin,
+                                  SparseFieldsetSerializerMixin,
+                                  UserSerializer):
     """ Кастомный сериализатор для отображения профиля пользователя
     в других контекстах."""
     is_subscribed = serializers.SerializerMethodField()
@@ -118,10 +145,12 @@ class CustomUserContextSerializer(UserSerializer):
         return user.subscriptions.filter(author=author).exists()
 
     def get_recipes_count(self, author):
+        if hasattr(author, 'recipes_count'):
+            return author.recipes_count
         return author.recipes.all().count()
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     "Сериализатор для тегов."
     color = Hex2NameColor()
 
@@ -133,7 +162,8 @@ class TagSerializer(serializers.ModelSerializer):
                   'slug')
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(TimedSerializerMixin,
+                           serializers.ModelSerializer):
     "Сериализатор для ингредиентов."
 
     class Meta:
@@ -143,7 +173,9 @@ class IngredientSerializer(serializers.ModelSerializer):
                   'measurement_unit')
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(TimedSerializerMixin,
+                       SparseFieldsetSerializerMixin,
+                       serializers.ModelSerializer):
     "Сериализатор для создания-обновления рецептов."
     ingredients = serializers.SerializerMethodField()
     tags = serializers.SerializerMethodField()
@@ -219,6 +251,7 @@ class RecipeSerializer(serializers.ModelSerializer):
         recipe.tags.set(tags_list)
 
         self.create_ingredients(recipe, ingredients_data)
+        schedule_signature_update(recipe.pk)
 
         return recipe
 
@@ -233,10 +266,19 @@ class RecipeSerializer(serializers.ModelSerializer):
 
         instance.ingredients.clear()
         self.create_ingredients(instance, ingredients_data)
+        schedule_signature_update(instance.pk)
 
         return instance
 
     def get_ingredients(self, recipe):
+        if 'ingredients_used' in getattr(recipe,
+                                         '_prefetched_objects_cache', {}):
+            return [{'id': ingredient_recipe.ingredient.id,
+                     'name': ingredient_recipe.ingredient.name,
+                     'measurement_unit':
+                         ingredient_recipe.ingredient.measurement_unit,
+                     'amount': ingredient_recipe.amount}
+                    for ingredient_recipe in recipe.ingredients_used.all()]
         return recipe.ingredients.values(
             'id',
             'name',
@@ -245,6 +287,12 @@ class RecipeSerializer(serializers.ModelSerializer):
         )
 
     def get_tags(self, recipe):
+        if 'tags' in getattr(recipe, '_prefetched_objects_cache', {}):
+            return [{'id': tag.id,
+                     'name': tag.name,
+                     'slug': tag.slug,
+                     'color': tag.color}
+                    for tag in recipe.tags.all()]
         return recipe.tags.values()
 
     def get_is_favorited(self, recipe):
@@ -0,0 +1,58 @@
+from django.core.signals import request_started
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Ingredient, IngredientRecipe, Recipe, Tag
+from users.models import CustomUser
+
+from .authentication import invalidate_token, invalidate_user_tokens
+from .cache import (bump_recipes_version,
+                    invalidate_snapshot,
+                    invalidate_tag_slug_map)
+from .metrics import record_query
+from .utils import close_unusable_connections
+
+
+@receiver(connection_created)
+def install_query_timer(sender, connection, **kwargs):
+    # Обертка ставится на соединение, а не на запрос: в ASGI-режиме
+    # запросы к БД выполняются в потоках пула, а не в потоке middleware.
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@receiver(request_started)
+def check_connections(sender, **kwargs):
+    close_unusable_connections()
+
+
+@receiver([post_save, post_delete], sender=Tag)
+def tag_changed(sender, **kwargs):
+    invalidate_tag_slug_map()
+    invalidate_snapshot('tags')
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+def ingredient_changed(sender, **kwargs):
+    invalidate_snapshot('ingredients')
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+@receiver([post_save, post_delete], sender=IngredientRecipe)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def recipes_changed(sender, **kwargs):
+    bump_recipes_version()
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    invalidate_token(instance.key)
+
+
+@receiver([post_save, post_delete], sender=CustomUser)
+def user_changed(sender, instance, **kwargs):
+    invalidate_user_tokens(instance)
@@ -0,0 +1,15 @@
+import logging
+
+from jobs.queue import task
+
+from .warmup import warm_up
+
+logger = logging.getLogger(__name__)
+
+
+@task('api.warm_cache')
+def warm_cache(pages=None, url=None):
+    # Снимки и страницы рецептов лежат в общем кэше и видны всем воркерам
+    # gunicorn; импорты и таблицы URL процесса задачи им не помогут.
+    for name, count, seconds in warm_up(pages=pages, url=url, local=False):
+        logger.info('Warmed %s %s in %.1f ms', count, name, seconds * 1000)
@@ -0,0 +1,111 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.test import TestCase
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.views import CustomUserViewSet, IngredientViewSet, RecipeViewSet
+from recipes.models import (Favorite,
+                            Ingredient,
+                            IngredientRecipe,
+                            Recipe,
+                            ShoppingCart,
+                            Subscribe,
+                            Tag)
+from users.models import CustomUser
+
+FAST_SERIALIZATION_VIEWSETS = (CustomUserViewSet,
+                               IngredientViewSet,
+                               RecipeViewSet)
+PATHS = ('/api/recipes/',
+         '/api/recipes/?fields=name,image,cooking_time,tags,author',
+         '/api/recipes/?omit=text,ingredients',
+         '/api/recipes/?fields=is_favorited,is_in_shopping_cart',
+         '/api/users/',
+         '/api/users/?fields=username,is_subscribed',
+         '/api/users/?omit=email',
+         '/api/ingredients/',
+         '/api/ingredients/?name=со')
+AUTHENTICATED_PATHS = ('/api/users/subscriptions/',
+                       '/api/users/subscriptions/?omit=recipes',
+                       '/api/users/subscriptions/?fields=email,recipes_count',
+                       '/api/users/subscriptions/?recipes_limit=1')
+
+
+class FastSerializationTest(TestCase):
+    "Ответы быстрой сериализации должны совпадать с DRF байт в байт."
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, *authors = [
+            CustomUser.objects.create_user(email=f'{name}@example.com',
+                                           username=name,
+                                           first_name=name.title(),
+                                           last_name='Тестов',
+                                           password='password')
+            for name in ('reader', 'cook', 'baker')
+        ]
+        tags = [Tag.objects.create(name=name, slug=slug, color=color)
+                for name, slug, color in (('Завтрак', 'breakfast', '#E26C2D'),
+                                          ('Обед', 'lunch', '#49B64E'))]
+        ingredients = [
+            Ingredient.objects.create(name=name, measurement_unit=unit)
+            for name, unit in (('соль', 'г'), ('сахар', 'г'), ('мука', 'кг'))
+        ]
+        recipes = []
+        for index in range(4):
+            recipe = Recipe.objects.create(
+                author=authors[index % 2],
+                name=f'Рецепт {index}',
+                text=f'Описание "{index}"\nс переносом',
+                image=f'recipes/image/{index}.png',
+                cooking_time=10 + index
+            )
+            recipe.tags.set(tags[:index % 2 + 1])
+            for amount, ingredient in enumerate(ingredients[index % 2:],
+                                                start=1):
+                IngredientRecipe.objects.create(recipe=recipe,
+                                                ingredient=ingredient,
+                                                amount=amount)
+            recipes.append(recipe)
+
+        Favorite.objects.create(user=cls.user, recipe=recipes[0])
+        ShoppingCart.objects.create(user=cls.user, recipe=recipes[1])
+        Subscribe.objects.create(user=cls.user, author=authors[0])
+        Subscribe.objects.create(user=cls.user, author=authors[1])
+        cls.ids = f'{recipes[2].pk},{recipes[0].pk},999'
+        cls.token = Token.objects.create(user=cls.user)
+
+    def get_content(self, client, path, fast):
+        # Снимки и страницы для анонимов собраны другим вариантом.
+        caches[settings.SHARED_CACHE].clear()
+        for viewset in FAST_SERIALIZATION_VIEWSETS:
+            viewset.fast_serialization = fast
+        try:
+            response = client.get(path)
+        finally:
+            for viewset in FAST_SERIALIZATION_VIEWSETS:
+                viewset.fast_serialization = True
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.content
+
+    def assert_same_output(self, client, paths):
+        for path in paths:
+            with self.subTest(path=path):
+                self.assertEqual(self.get_content(client, path, fast=True),
+                                 self.get_content(client, path, fast=False))
+
+    def get_paths(self):
+        return PATHS + (f'/api/recipes/?ids={self.ids}',
+                        f'/api/recipes/?ids={self.ids}&fields=name,author')
+
+    def test_anonymous(self):
+        self.assert_same_output(APIClient(), self.get_paths())
+
+    def test_authenticated(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+        self.assert_same_output(client,
+                                self.get_paths() + AUTHENTICATED_PATHS)
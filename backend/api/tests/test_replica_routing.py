@@ -0,0 +1,93 @@
+from unittest import skipUnless
+
+from django.conf import settings
+from django.db import connections
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.middleware import ReplicaRoutingMiddleware
+from recipes.models import Recipe
+from users.models import CustomUser
+
+# Тест запускается с двумя локальными БД SQLite, например:
+# DEBUG=True DB_REPLICAS=replica.sqlite3 python manage.py test
+REPLICA = settings.DATABASE_REPLICAS[0] if settings.DATABASE_REPLICAS else None
+
+
+@skipUnless(REPLICA, 'DB_REPLICAS is not set')
+class ReplicaRoutingTest(TransactionTestCase):
+    databases = {'default', *settings.DATABASE_REPLICAS[:1]}
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='cook@example.com',
+                                                   username='cook',
+                                                   password='password')
+        self.recipe = Recipe.objects.create(author=self.user,
+                                            name='Суп',
+                                            text='Сварить',
+                                            image='recipes/image/soup.png',
+                                            cooking_time=10)
+        self.client = APIClient()
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.path = f'/api/recipes/{self.recipe.pk}/'
+
+    def get_recipe_queries(self, method, path):
+        "Метод выполнения запроса; возвращает чтения рецептов по БД."
+
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections[REPLICA]) as replica:
+            response = getattr(self.client, method)(path)
+        self.assertLess(response.status_code, 400)
+
+        def count(queries):
+            return sum('FROM "recipes_recipe"' in query['sql']
+                       for query in queries)
+
+        return count(primary), count(replica)
+
+    def test_safe_requests_read_from_replica(self):
+        primary, replica = self.get_recipe_queries('get', self.path)
+
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+    def test_reads_after_write_use_primary(self):
+        response = self.client.post(f'{self.path}favorite/')
+        self.assertIn(
+            ReplicaRoutingMiddleware.pin_cookie, response.cookies
+        )
+
+        primary, replica = self.get_recipe_queries('get', self.path)
+
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+    def test_pin_expires(self):
+        self.client.post(f'{self.path}favorite/')
+
+        with override_settings(REPLICA_PIN_SECONDS=0):
+            primary, replica = self.get_recipe_queries('get', self.path)
+
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+    def test_forged_pin_is_ignored(self):
+        self.client.cookies[ReplicaRoutingMiddleware.pin_cookie] = '1'
+
+        primary, replica = self.get_recipe_queries('get', self.path)
+
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+    def test_unpinned_reads_skip_primary(self):
+        # Первый запрос загружает токен в память воркера.
+        self.client.get(self.path)
+
+        with CaptureQueriesContext(connections['default']) as primary:
+            self.client.get(self.path)
+
+        self.assertEqual(len(primary), 0)
@@ -0,0 +1,177 @@
+import functools
+import math
+import threading
+import time
+
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+# Корзина сверяется не реже, чем израсходует эту долю емкости: за время
+# между сверками все воркеры вместе превысят лимит не больше, чем на
+# число воркеров, умноженное на эту долю.
+SYNC_BATCH_SHARE = 0.1
+SYNC_LOCK_TIMEOUT = 1
+SYNC_LOCK_WAIT = 0.1
+SYNC_LOCK_POLL_INTERVAL = 0.002
+RATE_PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+
+
+@functools.lru_cache(maxsize=None)
+def parse_rate(rate):
+    "Функция разбора ограничения '10/min' в (емкость, токенов в секунду)."
+
+    num, period = rate.split('/')
+    capacity = int(num)
+    return capacity, capacity / RATE_PERIODS[period[0]]
+
+
+class Bucket:
+    "Локальная корзина токенов."
+    __slots__ = ('tokens', 'updated', 'pending', 'synced')
+
+    def __init__(self, capacity, now):
+        self.tokens = capacity
+        self.updated = now
+        self.pending = 0
+        # Новая корзина сверяется при первом же запросе: иначе каждый
+        # перезапущенный воркер выдавал бы полную емкость заново.
+        self.synced = -math.inf
+
+
+class TokenBuckets:
+    """Корзины токенов процесса. Запросы расходуют локальные токены без
+    обращения к кэшу; раз в sync_interval секунд или после расхода доли
+    SYNC_BATCH_SHARE емкости расход передается в общий кэш (GCRA:
+    теоретическое время следующего запроса), а локальный остаток
+    урезается до общего."""
+
+    def __init__(self, max_size, sync_interval):
+        self.max_size = max_size
+        self.sync_interval = sync_interval
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def consume(self, key, capacity, rate):
+        "Метод расхода токена; возвращает время ожидания (0 - разрешено)."
+
+        now = time.monotonic()
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = Bucket(capacity, now)
+                while len(self.buckets) > self.max_size:
+                    self.buckets.popitem(last=False)
+            else:
+                self.buckets.move_to_end(key)
+                bucket.tokens = min(
+                    capacity, bucket.tokens + (now - bucket.updated) * rate
+                )
+                bucket.updated = now
+
+            consumed = None
+            if (now - bucket.synced >= self.sync_interval
+                    or bucket.pending >= capacity * SYNC_BATCH_SHARE):
+                consumed, bucket.pending = bucket.pending, 0
+                bucket.synced = now
+
+        # Сверка выполняется до решения: новая корзина не выдает полную
+        # емкость, не узнав общего остатка.
+        if consumed is not None:
+            remaining = self.sync(key, consumed, capacity, rate)
+
+        with self.lock:
+            if consumed is not None:
+                bucket.tokens = min(bucket.tokens, remaining)
+            if bucket.tokens >= 1:
+                bucket.tokens -= 1
+                bucket.pending += 1
+                return 0
+            return (1 - bucket.tokens) / rate
+
+    def sync(self, key, consumed, capacity, rate):
+        "Метод передачи расхода в общий кэш и получения общего остатка."
+
+        cache = caches[settings.THROTTLING['CACHE']]
+        cache_key = f'throttle:{key}'
+        interval_ms = 1000 / rate
+        timeout = math.ceil(capacity / rate) + 1
+        now_ms = int(time.time() * 1000)
+
+        # incr атомарен не во всех бэкендах (в DatabaseCache это чтение
+        # и запись), поэтому сверки одной корзины идут под блокировкой.
+        lock_key = f'{cache_key}:lock'
+        deadline = time.monotonic() + SYNC_LOCK_WAIT
+        while (not cache.add(lock_key, True, SYNC_LOCK_TIMEOUT)
+               and time.monotonic() < deadline):
+            time.sleep(SYNC_LOCK_POLL_INTERVAL)
+        try:
+            tat = cache.get(cache_key)
+            if tat is None or tat < now_ms:
+                tat = now_ms
+            tat += int(consumed * interval_ms)
+            if consumed:
+                cache.set(cache_key, tat, timeout)
+        finally:
+            cache.delete(lock_key)
+        return max(capacity - (tat - now_ms) / interval_ms, 0)
+
+
+buckets = TokenBuckets(settings.THROTTLING['MAX_BUCKETS'],
+                       settings.THROTTLING['SYNC_INTERVAL'])
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Базовый троттлинг по корзине токенов. Область берется из атрибута
+    throttle_scopes вьюсета по действию, ограничение - из
+    DEFAULT_THROTTLE_RATES по ключу '<область>_<kind>'. Сам по себе не
+    используется: наследник задает kind и get_cache_ident."""
+    kind = None
+    wait_time = None
+
+    def get_cache_ident(self, request):
+        """Метод получения того, кого ограничивать (пользователь, IP);
+        None - запрос не ограничивается этим классом."""
+
+        raise NotImplementedError('.get_cache_ident() must be overridden')
+
+    def allow_request(self, request, view):
+        scope = getattr(view, 'throttle_scopes', {}).get(view.action)
+        if scope is None:
+            return True
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(f'{scope}_{self.kind}')
+        ident = self.get_cache_ident(request)
+        if rate is None or ident is None:
+            return True
+
+        capacity, per_second = parse_rate(rate)
+        # Лимит входит в ключ: после его изменения корзины строятся заново.
+        self.wait_time = buckets.consume(f'{scope}:{self.kind}:{rate}:{ident}',
+                                         capacity,
+                                         per_second)
+        return self.wait_time == 0
+
+    def wait(self):
+        return self.wait_time
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    "Ограничение на пользователя; анонимов ограничивает только IP."
+    kind = 'user'
+
+    def get_cache_ident(self, request):
+        if request.user and request.user.is_authenticated:
+            return request.user.pk
+        return None
+
+
+class IPTokenBucketThrottle(TokenBucketThrottle):
+    "Ограничение на IP-адрес (с учетом NUM_PROXIES)."
+    kind = 'ip'
+
+    def get_cache_ident(self, request):
+        return self.get_ident(request)
@@ -1,9 +1,12 @@
+from django.conf import settings
 from django.urls import include, path
 
 from rest_framework import routers
 
+from .async_views import async_read_urls
 from .views import (CustomUserViewSet,
                     IngredientViewSet,
+                    MetricsView,
                     RecipeViewSet,
                     TagViewSet)
 
@@ -16,7 +19,12 @@ router.register('tags', TagViewSet)
 router.register('ingredients', IngredientViewSet)
 router.register('users', CustomUserViewSet)
 
+router_urls = router.urls
+if settings.ASYNC_READ_VIEWS:
+    router_urls = async_read_urls(router_urls)
+
 urlpatterns = [
-    path('', include(router.urls)),
+    path('', include(router_urls)),
     path('auth/', include('djoser.urls.authtoken')),
+    path('metrics', MetricsView.as_view(), name='metrics'),
 ]
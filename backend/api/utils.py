@@ -1,9 +1,53 @@
+import gzip
+import re
+
+from django.db import connections
+from django.db.models import Count, Exists, OuterRef, Q
+from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_vary_headers
 
 from rest_framework import status
 from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 
+from recipes.models import TagRecipe
+
+COOKING_TIME_BUCKETS = ((0, 15), (15, 30), (30, 60), (60, None))
+ACCEPTS_GZIP = re.compile(r'\bgzip\b')
+# Наибольшее значение BigAutoField: большие числа SQLite не принимает.
+ID_MAX = 2 ** 63 - 1
+
+
+def close_unusable_connections():
+    """Функция закрытия постоянных соединений с БД, разорванных сервером
+    или пулером, до их использования в запросе."""
+
+    for connection in connections.all():
+        if (connection.connection is not None
+                and connection.settings_dict.get('CONN_HEALTH_CHECKS')
+                and not connection.in_atomic_block
+                and not connection.is_usable()):
+            connection.close()
+
+
+def snapshot_response(request, snapshot):
+    """Функция выдачи JSON-снимка: сжатого, если клиент принимает gzip,
+    или ответа 304 при совпадении ETag."""
+
+    if ACCEPTS_GZIP.search(request.META.get('HTTP_ACCEPT_ENCODING', '')):
+        response = HttpResponse(snapshot['gzip'],
+                                content_type='application/json')
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = HttpResponse(gzip.decompress(snapshot['gzip']),
+                                content_type='application/json')
+    response['ETag'] = snapshot['etag']
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return get_conditional_response(request,
+                                    etag=snapshot['etag'],
+                                    response=response)
+
 
 def create_relation(request, model, model_relation, pk, serializer, field):
     "Функция создания связи User -> Model."
@@ -42,6 +86,59 @@ def delete_relation(request, model, model_relation, pk, field):
     )
 
 
+def get_limit_param(request, default, max_value):
+    "Функция получения ограничения размера выдачи из параметров запроса."
+
+    try:
+        limit = int(request.query_params.get('limit', default))
+    except ValueError:
+        raise ValidationError({'limit': 'Ожидается целое число'})
+    return max(1, min(limit, max_value))
+
+
+def get_ids_param(request, max_count):
+    "Функция получения списка id без повторов из параметра ids."
+
+    try:
+        ids = [int(value)
+               for value in request.query_params['ids'].split(',')
+               if value.strip()]
+    except ValueError:
+        raise ValidationError(
+            {'ids': 'Ожидается список целых чисел через запятую'}
+        )
+    ids = list(dict.fromkeys(ids))
+    if any(not 1 <= pk <= ID_MAX for pk in ids):
+        raise ValidationError({'ids': f'id должны быть от 1 до {ID_MAX}'})
+    if not ids:
+        raise ValidationError({'ids': 'Не указаны id'})
+    if len(ids) > max_count:
+        raise ValidationError({'ids': f'Не более {max_count} id за запрос'})
+    return ids
+
+
+def get_sparse_fields(request, available):
+    """Функция получения набора полей ответа из параметров fields= и omit=;
+    id остается в ответе всегда."""
+
+    params = request.query_params
+    if 'fields' not in params and 'omit' not in params:
+        return None
+
+    def split(value):
+        return {name.strip() for name in value.split(',') if name.strip()}
+
+    requested = split(params.get('fields', '')) or set(available)
+    omitted = split(params.get('omit', ''))
+    unknown = (requested | omitted) - set(available)
+    if unknown:
+        raise ValidationError(
+            {'fields': f'Неизвестные поля: {", ".join(sorted(unknown))}'}
+        )
+    return tuple(name for name in available
+                 if name == 'id' or name in requested - omitted)
+
+
 def get_validated_ingredients(ingredients_data, model):
     "Функция валидации ингредиентов рецепта."
 
@@ -89,3 +186,37 @@ def get_validated_tags(tags_list, model):
         )
 
     return tags_list
+
+
+def get_recipe_facets(queryset, tag_slug_map):
+    """Функция подсчета количества рецептов по тегам и интервалам
+    времени приготовления одним агрегирующим запросом."""
+
+    aggregates = {
+        f'tag_{tag_id}': Count('pk', filter=Q(Exists(
+            TagRecipe.objects.filter(recipe=OuterRef('pk'), tag_id=tag_id)
+        )))
+        for tag_id in tag_slug_map.values()
+    }
+    for index, (low, high) in enumerate(COOKING_TIME_BUCKETS):
+        bucket_filter = Q(cooking_time__gte=low)
+        if high is not None:
+            bucket_filter &= Q(cooking_time__lt=high)
+        aggregates[f'cooking_time_{index}'] = Count('pk',
+                                                    filter=bucket_filter)
+
+    counts = queryset.model.objects.filter(
+        pk__in=queryset.order_by().values('pk')
+    ).aggregate(**aggregates)
+
+    return {
+        'tags': [{'id': tag_id,
+                  'slug': slug,
+                  'count': counts[f'tag_{tag_id}']}
+                 for slug, tag_id in tag_slug_map.items()],
+        'cooking_time': [{'min': low,
+                          'max': high,
+                          'count': counts[f'cooking_time_{index}']}
+                         for index, (low, high)
+                         in enumerate(COOKING_TIME_BUCKETS)]
+    }
@@ -1,15 +1,30 @@
-from django.db.models import F, Prefetch
+from django.db.models import Count, Prefetch, Sum
 from django_filters.rest_framework import DjangoFilterBackend
 from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
 
 from djoser.views import UserViewSet
 
+from .cache import (get_or_build,
+                    get_recipes_version,
+                    get_snapshot,
+                    get_tag_slug_map,
+                    make_recipes_cache_key)
+from .fast_serializers import (get_recipe_columns,
+                               serialize_ingredients,
+                               serialize_recipes,
+                               serialize_subscriptions,
+                               serialize_users)
 from .filters import IngredientFilterSet, RecipeFilterSet
+from .idempotency import idempotent
+from .metrics import request_metrics
 
 from rest_framework import status
 from rest_framework.decorators import action
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
 from rest_framework import permissions, viewsets
 
@@ -20,6 +35,7 @@ from recipes.models import (Favorite,
                             ShoppingCart,
                             Subscribe,
                             Tag)
+from recipes.similarity import get_similar_recipes
 
 from users.models import CustomUser
 
@@ -28,21 +44,81 @@ from .serializers import (CustomUserSerializer,
                           IngredientSerializer,
                           RecipeSerializer,
                           RecipeContextSerializer,
+                          SparseFieldsetSerializerMixin,
                           TagSerializer)
 
 from .paginators import CustomPagination
 
 from .permissions import IsAdminOrAuthorOrReadOnly
 
-from .utils import create_relation, delete_relation
-
-
-class CustomUserViewSet(UserViewSet):
+from .throttles import IPTokenBucketThrottle, UserTokenBucketThrottle
+
+from .utils import (create_relation,
+                    delete_relation,
+                    get_ids_param,
+                    get_limit_param,
+                    get_recipe_facets,
+                    get_sparse_fields,
+                    snapshot_response)
+
+SIMILAR_RECIPES_LIMIT = 6
+SIMILAR_RECIPES_MAX_LIMIT = 50
+FACETS_CACHE_TIMEOUT = 60
+RECIPES_LIST_CACHE_TIMEOUT = 60
+RECIPES_BATCH_MAX = 100
+RECIPE_COLUMNS = ('id', 'name', 'text', 'image', 'cooking_time', 'author')
+USER_COLUMNS = ('id', 'username', 'email', 'first_name', 'last_name')
+
+
+class SparseFieldsetMixin:
+    """Миксин вьюсета для параметров fields= и omit=: лишние поля
+    не выводятся и не загружаются из БД."""
+    sparse_actions = ('list', 'retrieve')
+
+    def get_requested_fields(self, serializer_class=None):
+        serializer_class = serializer_class or self.get_serializer_class()
+        if (self.action not in self.sparse_actions
+                or self.request.method not in SAFE_METHODS
+                or not issubclass(serializer_class,
+                                  SparseFieldsetSerializerMixin)):
+            return None
+        return get_sparse_fields(self.request, serializer_class.Meta.fields)
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.get_requested_fields()
+        if fields is not None:
+            kwargs.setdefault('fields', fields)
+        return super().get_serializer(*args, **kwargs)
+
+
+class CustomUserViewSet(SparseFieldsetMixin, UserViewSet):
     "Кастомный вьюсет для пользователей."
     serializer_class = CustomUserSerializer
     queryset = CustomUser.objects.all()
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
     pagination_class = CustomPagination
+    sparse_actions = ('list', 'retrieve', 'me', 'subscriptions')
+    fast_serialization = True
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields = self.get_requested_fields()
+        if fields is not None:
+            queryset = queryset.only(
+                *(field for field in fields if field in USER_COLUMNS)
+            )
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        if not self.fast_serialization:
+            return super().list(request, *args, **kwargs)
+        fields = (self.get_requested_fields()
+                  or CustomUserSerializer.Meta.fields)
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset.values(*USER_COLUMNS))
+        return self.get_paginated_response(
+            serialize_users(page, request, fields)
+        )
 
     def get_permissions(self):
         if self.action == 'me':
@@ -52,6 +128,7 @@ class CustomUserViewSet(UserViewSet):
     @action(methods=['post', 'delete'],
             detail=True,
             permission_classes=[permissions.IsAuthenticated, ])
+    @idempotent
     def subscribe(self, request, id):
         author = get_object_or_404(CustomUser, pk=id)
         if request.user != author:
@@ -75,53 +152,227 @@ class CustomUserViewSet(UserViewSet):
     @action(detail=False,
             permission_classes=[permissions.IsAuthenticated, ])
     def subscriptions(self, request):
+        fields = self.get_requested_fields(CustomUserContextSerializer)
         subscribers_data = CustomUser.objects.filter(
             subscribers__user=request.user
         )
+        if fields is not None:
+            subscribers_data = subscribers_data.only(
+                *(field for field in fields if field in USER_COLUMNS)
+            )
+        else:
+            fields = CustomUserContextSerializer.Meta.fields
+        columns = USER_COLUMNS
+        if 'recipes_count' in fields:
+            # В запросах с GROUP BY Meta.ordering не применяется.
+            subscribers_data = subscribers_data.annotate(
+                recipes_count=Count('recipes', distinct=True)
+            ).order_by(*CustomUser._meta.ordering)
+            columns += ('recipes_count',)
+
+        if self.fast_serialization:
+            page = self.paginate_queryset(subscribers_data.values(*columns))
+            return self.get_paginated_response(
+                serialize_subscriptions(page, request, fields)
+            )
+
+        if 'recipes' in fields:
+            subscribers_data = subscribers_data.prefetch_related(Prefetch(
+                'recipes',
+                queryset=Recipe.objects.only('id',
+                                             'name',
+                                             'image',
+                                             'cooking_time',
+                                             'author')
+            ))
         page = self.paginate_queryset(subscribers_data)
         serializer = CustomUserContextSerializer(
-            page, many=True, context={'request': request}
+            page, many=True, fields=fields, context={'request': request}
         )
 
         return self.get_paginated_response(serializer.data)
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class SnapshotListMixin:
+    """Миксин выдачи полного списка без фильтров из кэшированного
+    и заранее сжатого JSON-снимка."""
+    snapshot_name = None
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params or request.accepted_renderer.format != 'json':
+            return super().list(request, *args, **kwargs)
+        snapshot = get_snapshot(self.snapshot_name, self.build_snapshot)
+        return snapshot_response(request, snapshot)
+
+    def build_snapshot(self):
+        serializer = self.get_serializer(self.get_queryset(), many=True)
+        return JSONRenderer().render(serializer.data)
+
+
+class TagViewSet(SnapshotListMixin, viewsets.ReadOnlyModelViewSet):
     "Вьюсет для Тегов."
+    snapshot_name = 'tags'
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(SnapshotListMixin, viewsets.ReadOnlyModelViewSet):
     "Вьюсет для ингредиентов."
+    snapshot_name = 'ingredients'
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilterSet
+    throttle_classes = (UserTokenBucketThrottle, IPTokenBucketThrottle)
+    throttle_scopes = {'list': 'ingredient_search'}
+    fast_serialization = True
+
+    def get_throttles(self):
+        # Полный список отдается из снимка и почти ничего не стоит.
+        if not self.request.query_params:
+            return []
+        return super().get_throttles()
+
+    def list(self, request, *args, **kwargs):
+        if not self.fast_serialization or not request.query_params:
+            return super().list(request, *args, **kwargs)
+        return Response(
+            serialize_ingredients(self.filter_queryset(self.get_queryset()))
+        )
 
+    def build_snapshot(self):
+        if not self.fast_serialization:
+            return super().build_snapshot()
+        return JSONRenderer().render(
+            serialize_ingredients(self.get_queryset())
+        )
 
-class RecipeViewSet(viewsets.ModelViewSet):
+
+class RecipeViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     "Вьюсет для рецептов."
-    queryset = Recipe.objects.select_related(
-        'author'
-    ).prefetch_related(
-        'tags',
-        Prefetch(
-            'ingredients_used',
-            queryset=IngredientRecipe.objects.select_related('ingredient')
-        )
-    ).all()
+    queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
     permission_classes = (IsAdminOrAuthorOrReadOnly,)
     pagination_class = CustomPagination
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilterSet
+    throttle_classes = (UserTokenBucketThrottle, IPTokenBucketThrottle)
+    throttle_scopes = {'create': 'recipe_create',
+                       'download_shopping_cart': 'shopping_cart_download'}
+    fast_serialization = True
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        fields = self.get_requested_fields()
+        if fields is not None:
+            queryset = queryset.only(
+                *(field for field in fields if field in RECIPE_COLUMNS)
+            )
+        else:
+            fields = RecipeSerializer.Meta.fields
+
+        if 'author' in fields:
+            queryset = queryset.select_related('author')
+        if 'tags' in fields:
+            queryset = queryset.prefetch_related('tags')
+        if 'ingredients' in fields:
+            queryset = queryset.prefetch_related(Prefetch(
+                'ingredients_used',
+                queryset=IngredientRecipe.objects.select_related('ingredient')
+            ))
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        if 'ids' in request.query_params:
+            return self.batch_retrieve(request)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        if request.user.is_authenticated:
+            data = self.get_page_data(queryset)
+        else:
+            # Страницы для анонимов одинаковы и кэшируются целиком; ссылки
+            # next/previous и изображения абсолютные, поэтому в ключе хост.
+            data = get_or_build(
+                make_recipes_cache_key(
+                    f'recipes:list:{request.scheme}://{request.get_host()}',
+                    request.query_params,
+                    ignored=('facets',)
+                ),
+                lambda: self.get_page_data(queryset),
+                RECIPES_LIST_CACHE_TIMEOUT,
+                version=get_recipes_version()
+            )
+        response = Response(data)
+
+        if request.query_params.get('facets') == '1':
+            response.data['facets'] = self.get_facets(queryset)
+
+        return response
+
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+
+    @idempotent
+    def update(self, request, *args, **kwargs):
+        return super().update(request, *args, **kwargs)
+
+    def get_page_data(self, queryset):
+        if self.fast_serialization:
+            fields = (self.get_requested_fields()
+                      or RecipeSerializer.Meta.fields)
+            page = self.paginate_queryset(queryset.prefetch_related(
+                None
+            ).values(*get_recipe_columns(fields)))
+            data = serialize_recipes(page, self.request, fields)
+        else:
+            page = self.paginate_queryset(queryset)
+            data = self.get_serializer(page, many=True).data
+        return self.get_paginated_response(data).data
+
+    def batch_retrieve(self, request):
+        ids = get_ids_param(request, RECIPES_BATCH_MAX)
+        queryset = self.get_queryset().filter(pk__in=ids)
+        if self.fast_serialization:
+            fields = (self.get_requested_fields()
+                      or RecipeSerializer.Meta.fields)
+            rows = queryset.prefetch_related(None).values(
+                *get_recipe_columns(fields)
+            )
+            found = {row['id']: row for row in rows}
+            results = serialize_recipes(
+                [found[pk] for pk in ids if pk in found], request, fields
+            )
+        else:
+            found = {recipe.pk: recipe for recipe in queryset}
+            results = self.get_serializer(
+                [found[pk] for pk in ids if pk in found], many=True
+            ).data
+
+        return Response({'results': results,
+                         'missing': [pk for pk in ids if pk not in found]})
+
+    def get_facets(self, queryset):
+        if self.request.user.is_authenticated:
+            return get_recipe_facets(queryset, get_tag_slug_map())
+
+        return get_or_build(
+            make_recipes_cache_key(
+                'recipes:facets',
+                self.request.query_params,
+                ignored=('page', 'limit', 'facets', 'fields', 'omit')
+            ),
+            lambda: get_recipe_facets(queryset, get_tag_slug_map()),
+            FACETS_CACHE_TIMEOUT,
+            version=get_recipes_version()
+        )
 
     @action(methods=['post', 'delete'],
             detail=True,
             permission_classes=[permissions.IsAuthenticated, ])
+    @idempotent
     def favorite(self, request, pk):
         if request.method == 'POST':
             return create_relation(request,
@@ -139,6 +390,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
     @action(methods=['post', 'delete'],
             detail=True,
             permission_classes=[permissions.IsAuthenticated])
+    @idempotent
     def shopping_cart(self, request, pk):
         if request.method == 'POST':
             return create_relation(request,
@@ -153,35 +405,56 @@ class RecipeViewSet(viewsets.ModelViewSet):
                                pk,
                                field='recipe')
 
-    @action(detail=False,
-            permission_classes=[permissions.IsAuthenticated])
-    def download_shopping_cart(self, request, *args, **kwargs):
-        recipes = Recipe.objects.filter(
-            in_shopping_cart_for_users__user=request.user
+    @action(detail=True)
+    def similar(self, request, pk):
+        recipe = get_object_or_404(Recipe, pk=pk)
+        limit = get_limit_param(request,
+                                default=SIMILAR_RECIPES_LIMIT,
+                                max_value=SIMILAR_RECIPES_MAX_LIMIT)
+        similar_ids = [recipe_id for recipe_id, _
+                       in get_similar_recipes(recipe, limit)]
+        recipes = Recipe.objects.in_bulk(similar_ids)
+        serializer = RecipeContextSerializer(
+            [recipes[recipe_id] for recipe_id in similar_ids
+             if recipe_id in recipes],
+            many=True,
+            context={'request': request}
         )
 
-        shopping_cart = {}
-
-        for recipe in recipes:
-            ingredients = recipe.ingredients.values(
-                'name',
-                'measurement_unit',
-                amount=F('recipes_used__amount')
-            )
+        return Response(serializer.data)
 
-            for ingredient in ingredients:
-                name = (f"{ingredient['name']} "
-                        f"({ingredient['measurement_unit']}) - ")
-                amount = ingredient['amount']
-                shopping_cart[name] = shopping_cart.get(name, 0) + amount
+    @action(detail=False,
+            permission_classes=[permissions.IsAuthenticated])
+    def download_shopping_cart(self, request, *args, **kwargs):
+        # Количества суммируются в БД одним запросом, сколько бы рецептов
+        # ни было в корзине.
+        ingredients = IngredientRecipe.objects.filter(
+            recipe__in_shopping_cart_for_users__user=request.user
+        ).values(
+            'ingredient__name',
+            'ingredient__measurement_unit'
+        ).annotate(
+            total=Sum('amount')
+        ).order_by('ingredient__name', 'ingredient__measurement_unit')
 
         shopping_list = 'Список покупок:\n'
 
-        for key, value in shopping_cart.items():
-            shopping_list += f'{key}{value}\n'
+        for ingredient in ingredients:
+            shopping_list += (f"{ingredient['ingredient__name']} "
+                              f"({ingredient['ingredient__measurement_unit']})"
+                              f" - {ingredient['total']}\n")
 
         filename = 'shopping_list.txt'
         response = HttpResponse(shopping_list, content_type='text/plain')
         response['Content-Disposition'] = f'attachment; filename={filename}'
 
         return response
+
+
+class MetricsView(APIView):
+    "Представление метрик запросов в формате Prometheus."
+    permission_classes = (permissions.IsAdminUser,)
+
+    def get(self, request):
+        return HttpResponse(request_metrics.render_prometheus(),
+                            content_type='text/plain; version=0.0.4')
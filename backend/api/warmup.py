@@ -0,0 +1,99 @@
+import inspect
+import time
+import urllib.parse
+
+from django.conf import settings
+from django.test import Client
+from django.urls import get_resolver
+from rest_framework.serializers import BaseSerializer
+
+from recipes.models import Tag
+
+from . import serializers
+from .paginators import CustomPagination
+
+
+def warm_urls():
+    "Функция построения таблиц URL-резолвера и импорта представлений."
+
+    resolver = get_resolver()
+    resolver.reverse_dict
+    return len(resolver.url_patterns)
+
+
+def warm_serializers():
+    """Функция импорта и построения полей всех сериализаторов API;
+    DRF собирает поля ModelSerializer из моделей при первом обращении."""
+
+    classes = [
+        serializer for _, serializer in inspect.getmembers(
+            serializers, inspect.isclass
+        )
+        if issubclass(serializer, BaseSerializer)
+        and serializer.__module__ == serializers.__name__
+    ]
+    for serializer in classes:
+        serializer().fields
+    return len(classes)
+
+
+def get_tag_combinations():
+    """Функция получения частых наборов тегов: главная страница запрашивает
+    рецепты без тегов, затем со всеми тегами, а фильтр - по одному тегу."""
+
+    slugs = list(Tag.objects.values_list('slug', flat=True))
+    return [(), tuple(slugs)] + [(slug,) for slug in slugs]
+
+
+def warm_path(client, path):
+    return int(client.get(path).status_code == 200)
+
+
+def warm_recipe_pages(client, pages):
+    "Функция прогрева кэша первых страниц списка рецептов для анонимов."
+
+    warmed = 0
+    for tags in get_tag_combinations():
+        for page in range(1, pages + 1):
+            response = client.get('/api/recipes/', [
+                ('page', page),
+                ('limit', CustomPagination.page_size),
+                *(('tags', slug) for slug in tags),
+            ])
+            if response.status_code != 200:
+                break
+            warmed += 1
+            if not response.data['next']:
+                break
+    return warmed
+
+
+def warm_up(pages=None, url=None, local=True):
+    """Функция прогрева кэшей и ленивых импортов процесса. Запросы идут
+    через весь стек middleware с хостом и схемой из url, чтобы ключи кэша
+    совпали с ключами запросов пользователей. Снимки справочников и
+    страницы рецептов попадают в общий кэш; local=False пропускает
+    прогрев, полезный только текущему процессу.
+
+    Возвращает список (что прогрето, количество, время в секундах)."""
+
+    pages = settings.WARMUP['PAGES'] if pages is None else pages
+    url = urllib.parse.urlsplit(url or settings.WARMUP['URL'])
+    client = Client(HTTP_HOST=url.netloc, secure=url.scheme == 'https')
+
+    steps = (
+        ('urls', warm_urls),
+        ('serializers', warm_serializers),
+    ) if local else ()
+    steps += (
+        ('tags snapshot', lambda: warm_path(client, '/api/tags/')),
+        ('ingredients snapshot',
+         lambda: warm_path(client, '/api/ingredients/')),
+        ('recipe list pages', lambda: warm_recipe_pages(client, pages)),
+    )
+    report = []
+    for name, warm in steps:
+        started = time.perf_counter()
+        count = warm()
+        report.append((name, count, time.perf_counter() - started))
+    return report
@@ -0,0 +1,41 @@
+import random
+
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# По умолчанию (команды, shell, фоновые задачи) все идет в основную БД;
+# чтение с реплик разрешает только ReplicaRoutingMiddleware.
+use_primary = ContextVar('use_primary', default=True)
+
+
+class ReplicaRouter:
+    """Роутер, направляющий чтение безопасных запросов на реплики,
+    а запись и чтение внутри транзакций - в основную БД."""
+
+    def db_for_read(self, model, **hints):
+        # Общий кэш в БД (DatabaseCache) хранит ответы для повторов
+        # и отзывы токенов, поэтому отставание реплики для него недопустимо.
+        if (not settings.DATABASE_REPLICAS
+                or model._meta.app_label == 'django_cache'
+                or use_primary.get()
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        # Связанные объекты читаются с той же реплики, что и исходный;
+        # объекты с основной БД (например, из кэша токенов) - с любой.
+        instance = hints.get('instance')
+        if (instance is not None
+                and instance._state.db in settings.DATABASE_REPLICAS):
+            return instance._state.db
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная БД.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return True
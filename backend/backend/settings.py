@@ -28,18 +28,62 @@ INSTALLED_APPS = [
     'api.apps.ApiConfig',
     'recipes.apps.RecipesConfig',
     'users.apps.UsersConfig',
+    'jobs.apps.JobsConfig',
 ]
 
 MIDDLEWARE = [
+    'api.middleware.ServerTimingMiddleware',
+    'api.middleware.CompressionMiddleware',
+    'api.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'api.middleware.BrowserMiddleware',
+    'api.middleware.ProfilingMiddleware',
+    'api.middleware.QueryInspectorMiddleware',
+]
+
+API_PATH_PREFIX = '/api/'
+
+# HTML не сжимается: страницы с CSRF-токеном уязвимы к BREACH.
+COMPRESSION = {
+    'MIN_SIZE': int(os.getenv('COMPRESSION_MIN_SIZE', 1024)),
+    'CONTENT_TYPES': ('application/json', 'text/plain'),
+}
+
+# Прогрев кэшей воркера после запуска (api.warmup); URL - адрес, по
+# которому сайт открывают пользователи: хост входит в ключи кэша.
+WARMUP = {
+    'ENABLED': os.getenv('WARMUP_ENABLED', 'True') == 'True',
+    'URL': os.getenv('WARMUP_URL', 'http://localhost'),
+    'PAGES': int(os.getenv('WARMUP_PAGES', 3)),
+}
+
+# В ASGI-режиме чтение рецептов, тегов и ингредиентов идет через
+# асинхронные представления (api.async_views).
+ASYNC_READ_VIEWS = os.getenv('SERVER_INTERFACE') == 'asgi'
+
+BROWSER_MIDDLEWARE = [
+    'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+SILENCED_SYSTEM_CHECKS = [
+    # Middleware админки подключены через BROWSER_MIDDLEWARE.
+    'admin.E408',
+    'admin.E409',
+    'admin.E410',
+]
+
+QUERY_INSPECTOR = {
+    'ENABLED': os.getenv('QUERY_INSPECTOR') == 'True',
+    'N_PLUS_ONE_THRESHOLD': int(os.getenv('QUERY_INSPECTOR_N_PLUS_ONE', 3)),
+    'SLOW_QUERY_MS': float(os.getenv('QUERY_INSPECTOR_SLOW_MS', 100)),
+    'RAISE': os.getenv('QUERY_INSPECTOR_RAISE') == 'True',
+}
+
 ROOT_URLCONF = 'backend.urls'
 
 TEMPLATES = [
@@ -58,6 +102,18 @@ TEMPLATES = [
     },
 ]
 
+# tracemalloc считает выделения памяти всех потоков процесса: включать
+# TRACE_ALLOCATIONS стоит только для воркеров, обслуживающих один запрос
+# за раз (GUNICORN_THREADS=1 без ASGI).
+PROFILING = {
+    'DIR': os.getenv('PROFILING_DIR', BASE_DIR / 'profiles'),
+    'RATE_PER_MINUTE': int(os.getenv('PROFILING_RATE_PER_MINUTE', 2)),
+    'MAX_DUMPS': int(os.getenv('PROFILING_MAX_DUMPS', 100)),
+    'TRACE_ALLOCATIONS': os.getenv('PROFILING_TRACE_ALLOCATIONS') == 'True',
+    'TOP_FUNCTIONS': 40,
+    'TOP_ALLOCATIONS': 20,
+}
+
 WSGI_APPLICATION = 'backend.wsgi.application'
 
 if DEBUG:
@@ -75,10 +131,68 @@ else:
             'USER': os.getenv('POSTGRES_USER', 'django'),
             'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
             'HOST': os.getenv('DB_HOST', ''),
-            'PORT': os.getenv('DB_PORT', 5432)
+            'PORT': os.getenv('DB_PORT', 5432),
+            'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+            # Ключ из Django 4.1; до обновления проверку выполняет
+            # api.signals.check_connections.
+            'CONN_HEALTH_CHECKS': os.getenv('DB_CONN_HEALTH_CHECKS',
+                                            'True') == 'True',
+            # PgBouncer в режиме transaction не сохраняет курсоры
+            # между транзакциями.
+            'DISABLE_SERVER_SIDE_CURSORS': os.getenv(
+                'DB_DISABLE_SERVER_SIDE_CURSORS'
+            ) == 'True',
         }
     }
 
+# Реплики для чтения через запятую: хосты Postgres (host или host:port),
+# при DEBUG - файлы SQLite, например копия db.sqlite3.
+DATABASE_REPLICAS = []
+replicas = filter(None, os.getenv('DB_REPLICAS', '').split(','))
+for index, replica in enumerate(replicas):
+    alias = f'replica_{index}'
+    DATABASES[alias] = {**DATABASES['default'],
+                        'TEST': {'MIRROR': 'default'}}
+    if DEBUG:
+        DATABASES[alias]['NAME'] = BASE_DIR / replica.strip()
+    else:
+        host, _, port = replica.strip().partition(':')
+        DATABASES[alias].update(HOST=host,
+                                PORT=port or DATABASES['default']['PORT'])
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['backend.db_router.ReplicaRouter']
+
+# Сколько секунд после записи запросы клиента читают с основной БД,
+# чтобы видеть свои изменения несмотря на отставание реплик (подписанная
+# cookie, см. api.middleware.ReplicaRoutingMiddleware).
+REPLICA_PIN_SECONDS = int(os.getenv('DB_REPLICA_PIN_SECONDS', 5))
+
+
+def get_cache_config(prefix, backend, location):
+    return {'BACKEND': os.getenv(f'{prefix}_BACKEND', backend),
+            'LOCATION': os.getenv(f'{prefix}_LOCATION', location)}
+
+
+# default - быстрый кэш процесса; shared - общий для всех воркеров
+# (снимки, страницы и версия рецептов, идемпотентность, троттлинг, отзыв
+# токенов). По умолчанию shared - таблица в БД (manage.py
+# createcachetable), ее можно заменить на Memcached.
+CACHES = {
+    'default': get_cache_config(
+        'CACHE', 'django.core.cache.backends.locmem.LocMemCache', ''
+    ),
+    'shared': get_cache_config(
+        'SHARED_CACHE', 'django.core.cache.backends.db.DatabaseCache',
+        'shared_cache'
+    ),
+}
+SHARED_CACHE = 'shared'
+
+# Раз во сколько секунд воркер сверяет свою копию соответствия slug -> id
+# тегов с версией в общем кэше.
+TAGS_CHECK_INTERVAL = float(os.getenv('TAGS_CHECK_INTERVAL', 1))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -99,8 +213,65 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.TimedJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    # Области задаются во вьюсетах (throttle_scopes), см. api.throttles.
+    'DEFAULT_THROTTLE_RATES': {
+        'recipe_create_user': '30/hour',
+        'recipe_create_ip': '100/hour',
+        'shopping_cart_download_user': '20/min',
+        'shopping_cart_download_ip': '60/min',
+        'ingredient_search_user': '120/min',
+        'ingredient_search_ip': '300/min',
+    },
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', 1)),
+}
+
+# Локальные корзины токенов сверяются через общий кэш раз в SYNC_INTERVAL
+# секунд; с локальным кэшем каждый воркер пропускал бы полный лимит
+# (проверяется при запуске gunicorn, см. api.checks).
+THROTTLING = {
+    'CACHE': os.getenv('THROTTLE_CACHE', SHARED_CACHE),
+    'SYNC_INTERVAL': float(os.getenv('THROTTLE_SYNC_INTERVAL', 1)),
+    'MAX_BUCKETS': int(os.getenv('THROTTLE_MAX_BUCKETS', 10000)),
+}
+
+# Токен в памяти воркера сверяется с поколением в общем кэше не чаще раза
+# в CHECK_INTERVAL секунд: столько может действовать токен, отозванный
+# в другом воркере.
+TOKEN_AUTH_CACHE = {
+    'MAX_SIZE': int(os.getenv('TOKEN_AUTH_CACHE_SIZE', 4096)),
+    'TTL': int(os.getenv('TOKEN_AUTH_CACHE_TTL', 60)),
+    'CHECK_INTERVAL': float(os.getenv('TOKEN_AUTH_CHECK_INTERVAL', 5)),
+    'SHARED_CACHE': os.getenv('TOKEN_AUTH_SHARED_CACHE', SHARED_CACHE),
+}
+
+# Ответы на запросы с Idempotency-Key (api.idempotency); кэш должен быть
+# общим, иначе повтор, попавший в другой воркер, выполнит запись снова
+# (проверяется при запуске gunicorn, см. api.checks).
+IDEMPOTENCY = {
+    'CACHE': os.getenv('IDEMPOTENCY_CACHE', SHARED_CACHE),
+    'TTL': int(os.getenv('IDEMPOTENCY_TTL', 24 * 60 * 60)),
+}
+
+# Очередь фоновых задач (приложение jobs): воркер продлевает захват задачи
+# каждую треть LOCK_TIMEOUT, задача без продления дольше LOCK_TIMEOUT
+# возвращается в очередь. Сигнатуры похожих рецептов пересчитывает воркер;
+# без сервиса worker нужен ASYNC = False, иначе новые рецепты не попадут
+# в /similar/.
+JOBS = {
+    'ASYNC': os.getenv('JOBS_ASYNC', 'True') == 'True',
+    'WORKERS': int(os.getenv('JOBS_WORKERS', 2)),
+    'POLL_INTERVAL': float(os.getenv('JOBS_POLL_INTERVAL', 1)),
+    'MAX_ATTEMPTS': int(os.getenv('JOBS_MAX_ATTEMPTS', 5)),
+    'BACKOFF_BASE': 10,
+    'BACKOFF_MAX': 60 * 60,
+    'LOCK_TIMEOUT': int(os.getenv('JOBS_LOCK_TIMEOUT', 10 * 60)),
+    'KEEP_DONE': 7 * 24 * 60 * 60,
 }
 
 DJOSER = {
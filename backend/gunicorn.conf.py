@@ -0,0 +1,98 @@
+import multiprocessing
+import os
+import threading
+
+# Все параметры можно переопределить переменными окружения GUNICORN_*.
+CPU_COUNT = multiprocessing.cpu_count()
+ASGI = os.getenv('SERVER_INTERFACE') == 'asgi'
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+
+if ASGI:
+    # Асинхронному воркеру потоки не нужны: чтение и так уходит в пул.
+    wsgi_app = 'backend.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+    workers = int(os.getenv('GUNICORN_WORKERS', CPU_COUNT))
+    threads = 1
+else:
+    wsgi_app = 'backend.wsgi:application'
+    worker_class = 'gthread'
+    workers = int(os.getenv('GUNICORN_WORKERS', CPU_COUNT * 2 + 1))
+    threads = int(os.getenv('GUNICORN_THREADS', 4))
+
+# Каждый поток держит свое соединение с основной БД (при CONN_MAX_AGE > 0
+# и между запросами), поэтому workers * threads не должно превышать
+# бюджет соединений: max_connections Postgres (100 по умолчанию) за
+# вычетом воркеров фоновых задач, миграций и администрирования. За
+# PgBouncer бюджет - его max_client_conn, а DB_CONN_MAX_AGE=0 возвращает
+# соединения пулу после каждого запроса. 0 - без ограничения.
+DB_MAX_CONNECTIONS = int(os.getenv('DB_MAX_CONNECTIONS', 80))
+REQUESTED_WORKERS = workers
+if DB_MAX_CONNECTIONS and workers * threads > DB_MAX_CONNECTIONS:
+    workers = max(1, DB_MAX_CONNECTIONS // threads)
+
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True') == 'True'
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 100))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+
+
+def on_starting(server):
+    if server.cfg.workers < REQUESTED_WORKERS:
+        server.log.warning(
+            'Workers reduced from %s to %s: %s threads each must fit '
+            'DB_MAX_CONNECTIONS=%s', REQUESTED_WORKERS, server.cfg.workers,
+            threads, DB_MAX_CONNECTIONS
+        )
+    # Без preload_app Django в мастере еще не настроен.
+    import django
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+    django.setup()
+    from api.checks import ensure_shared_caches
+
+    ensure_shared_caches(server.cfg.workers)
+
+
+def post_fork(server, worker):
+    # При preload_app мастер мог открыть соединения с БД при импорте;
+    # делить один сокет между процессами нельзя.
+    from django.db import connections
+
+    connections.close_all()
+
+
+def warm_up_worker(log):
+    from django.db import connections
+
+    from api.warmup import warm_up
+
+    try:
+        report = warm_up()
+    except Exception:
+        log.exception('Cache warm-up failed')
+    else:
+        log.info('Cache warm-up: %s in %.1f ms', ', '.join(
+            f'{name} {count} ({seconds * 1000:.0f} ms)'
+            for name, count, seconds in report
+        ), sum(seconds for _, _, seconds in report) * 1000)
+    finally:
+        connections.close_all()
+
+
+def post_worker_init(worker):
+    # Прогрев после загрузки приложения в воркере: при preload_app=False
+    # в post_fork Django еще не настроен. Прогрев идет в отдельном потоке:
+    # воркер начинает отмечаться мастеру и принимать запросы сразу, и
+    # долгий прогрев не приведет к перезапуску воркера по timeout.
+    from django.conf import settings
+
+    if settings.WARMUP['ENABLED']:
+        threading.Thread(target=warm_up_worker,
+                         args=(worker.log,),
+                         name='cache-warm-up',
+                         daemon=True).start()
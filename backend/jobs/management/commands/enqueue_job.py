@@ -0,0 +1,35 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from jobs.queue import enqueue, tasks
+
+
+class Command(BaseCommand):
+    help = 'Put a background job in the queue, e.g. from cron'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', help=f'One of: {", ".join(sorted(tasks))}')
+        parser.add_argument('--payload', default='{}',
+                            help='Task keyword arguments as a JSON object')
+        parser.add_argument('--priority', type=int, default=0)
+        parser.add_argument('--dedup-key')
+        parser.add_argument('--delay', type=float, default=0,
+                            help='Seconds to wait before running')
+
+    def handle(self, *args, **options):
+        try:
+            payload = json.loads(options['payload'])
+        except ValueError as error:
+            raise CommandError(f'Invalid --payload: {error}')
+        if not isinstance(payload, dict):
+            raise CommandError('--payload must be a JSON object')
+        try:
+            job = enqueue(options['name'],
+                          payload=payload,
+                          priority=options['priority'],
+                          dedup_key=options['dedup_key'],
+                          delay=options['delay'])
+        except ValueError as error:
+            raise CommandError(error)
+        self.stdout.write(f'Queued {job} ({job.status})')
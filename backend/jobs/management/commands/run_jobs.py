@@ -0,0 +1,108 @@
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, close_old_connections, connections
+
+from jobs.queue import claim, heartbeat, purge_done, release_stale, run
+
+MAINTENANCE_INTERVAL = 60
+
+logger = logging.getLogger(__name__)
+
+
+def work(poll_interval, once, stop):
+    """Функция цикла воркера: задачи берутся по одной, между ними
+    проверяется флаг остановки, поэтому начатая задача всегда дописывается."""
+
+    worker_id = f'{socket.gethostname()}:{os.getpid()}'
+    maintained_at = -MAINTENANCE_INTERVAL
+    processed = 0
+    while not stop.is_set():
+        # Как на запросах: закрыть соединения старше CONN_MAX_AGE
+        # и сломанные, иначе воркер не переживет перезапуск БД.
+        close_old_connections()
+        try:
+            if time.monotonic() - maintained_at >= MAINTENANCE_INTERVAL:
+                release_stale()
+                purge_done()
+                maintained_at = time.monotonic()
+
+            job = claim(worker_id)
+            if job is None:
+                if once:
+                    break
+                stop.wait(poll_interval)
+                continue
+            with heartbeat(job):
+                run(job)
+        except DatabaseError:
+            # БД недоступна или занята: задача, не получившая статус,
+            # вернется в очередь через LOCK_TIMEOUT.
+            logger.exception('Job worker %s lost the database', worker_id)
+            connections.close_all()
+            stop.wait(poll_interval)
+            continue
+        processed += 1
+    connections.close_all()
+    return processed
+
+
+def run_worker(poll_interval, once):
+    stop = threading.Event()
+
+    def shutdown(signum, frame):
+        stop.set()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    return work(poll_interval, once, stop)
+
+
+class Command(BaseCommand):
+    help = ('Run background job workers; SIGTERM or SIGINT lets the current '
+            'jobs finish before exiting')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int,
+                            default=settings.JOBS['WORKERS'])
+        parser.add_argument('--poll-interval', type=float,
+                            default=settings.JOBS['POLL_INTERVAL'])
+        parser.add_argument('--once', action='store_true',
+                            help='Exit when no job is ready instead of '
+                                 'waiting for new ones')
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError('--workers must be positive')
+        args = (options['poll_interval'], options['once'])
+
+        if options['workers'] == 1:
+            processed = run_worker(*args)
+            self.stdout.write(f'Processed {processed} jobs')
+            return
+
+        # Дочерние процессы не должны унаследовать открытые соединения.
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        processes = [context.Process(target=run_worker, args=args)
+                     for _ in range(options['workers'])]
+        for process in processes:
+            process.start()
+
+        def shutdown(signum, frame):
+            for process in processes:
+                if process.is_alive():
+                    os.kill(process.pid, signal.SIGTERM)
+
+        signal.signal(signal.SIGTERM, shutdown)
+        signal.signal(signal.SIGINT, shutdown)
+        for process in processes:
+            process.join()
+        self.stdout.write(f'{len(processes)} workers stopped')
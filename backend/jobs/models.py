@@ -0,0 +1,59 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Job(models.Model):
+    "Модель фоновой задачи."
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Ошибка'),
+    )
+
+    name = models.CharField('Задача', max_length=200)
+    payload = models.JSONField('Параметры', default=dict, blank=True)
+    status = models.CharField('Статус',
+                              max_length=10,
+                              choices=STATUSES,
+                              default=QUEUED)
+    priority = models.SmallIntegerField('Приоритет', default=0)
+    dedup_key = models.CharField('Ключ дедупликации',
+                                 max_length=200,
+                                 null=True,
+                                 blank=True)
+    run_at = models.DateTimeField('Запуск не раньше', default=timezone.now)
+    attempts = models.PositiveSmallIntegerField('Попытки', default=0)
+    max_attempts = models.PositiveSmallIntegerField('Максимум попыток',
+                                                    default=5)
+    locked_by = models.CharField('Воркер', max_length=100, blank=True)
+    locked_at = models.DateTimeField('Взята в работу', null=True, blank=True)
+    last_error = models.TextField('Последняя ошибка', blank=True)
+    created = models.DateTimeField('Создана', auto_now_add=True)
+    finished_at = models.DateTimeField('Завершена', null=True, blank=True)
+
+    class Meta:
+        ordering = ['-priority', 'run_at', 'id']
+        verbose_name = 'Job'
+        verbose_name_plural = 'Jobs'
+        indexes = [
+            models.Index(fields=['status', '-priority', 'run_at', 'id'],
+                         name='job_claim_order'),
+        ]
+        constraints = [
+            # Пока задача с ключом ждет в очереди, вторая такая же не
+            # ставится. Выполняющаяся могла прочитать данные до изменения,
+            # поэтому рядом с ней новую задачу поставить можно.
+            models.UniqueConstraint(
+                fields=['dedup_key'],
+                condition=models.Q(status='queued'),
+                name='unique_pending_job_dedup_key'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk}'
@@ -0,0 +1,208 @@
+import contextlib
+import logging
+import random
+import threading
+import traceback
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+CLAIM_BATCH = 10
+# Доля LOCK_TIMEOUT, через которую воркер продлевает захват задачи.
+HEARTBEAT_SHARE = 1 / 3
+
+logger = logging.getLogger(__name__)
+tasks = {}
+
+
+def task(name):
+    """Декоратор регистрации функции фоновой задачи; параметры задачи
+    передаются ей именованными аргументами."""
+
+    def register(func):
+        tasks[name] = func
+        return func
+
+    return register
+
+
+def enqueue(name, payload=None, priority=0, dedup_key=None, delay=0,
+            max_attempts=None):
+    """Функция постановки задачи в очередь. Внутри транзакции задача
+    становится видна воркерам только после ее фиксации. Если задача
+    с тем же dedup_key уже ждет в очереди, возвращается она."""
+
+    if name not in tasks:
+        raise ValueError(f'Unknown task {name!r}')
+    job = Job(name=name,
+              payload=payload or {},
+              priority=priority,
+              dedup_key=dedup_key,
+              run_at=timezone.now() + timedelta(seconds=delay),
+              max_attempts=max_attempts or settings.JOBS['MAX_ATTEMPTS'])
+    if dedup_key is None:
+        job.save()
+        return job
+
+    while True:
+        try:
+            with transaction.atomic():
+                job.save()
+            return job
+        except IntegrityError:
+            queued = Job.objects.filter(dedup_key=dedup_key,
+                                        status=Job.QUEUED).first()
+            # Задачу могли взять в работу между вставкой и выборкой.
+            if queued is not None:
+                return queued
+
+
+def claim(worker_id):
+    """Функция захвата следующей задачи. Захват - условный UPDATE по
+    статусу: из двух воркеров, выбравших одну задачу, ее получит один."""
+
+    now = timezone.now()
+    candidates = list(Job.objects.filter(
+        status=Job.QUEUED, run_at__lte=now
+    ).values_list('pk', flat=True)[:CLAIM_BATCH])
+    for pk in candidates:
+        if Job.objects.filter(pk=pk, status=Job.QUEUED).update(
+            status=Job.RUNNING,
+            locked_by=worker_id,
+            locked_at=now,
+            attempts=F('attempts') + 1
+        ):
+            return Job.objects.get(pk=pk)
+    return None
+
+
+def get_backoff(attempts):
+    "Функция расчета задержки перед повтором: экспонента со случайностью."
+
+    delay = min(settings.JOBS['BACKOFF_BASE'] * 2 ** (attempts - 1),
+                settings.JOBS['BACKOFF_MAX'])
+    return delay * random.uniform(0.5, 1)
+
+
+def requeue(job, delay, **fields):
+    """Функция возврата задачи в очередь. Если в очереди уже есть задача
+    с тем же dedup_key, работу сделает она, а эта завершается ошибкой."""
+
+    owned = Job.objects.filter(pk=job.pk,
+                               status=Job.RUNNING,
+                               locked_by=job.locked_by)
+    try:
+        with transaction.atomic():
+            owned.update(status=Job.QUEUED,
+                         run_at=timezone.now() + timedelta(seconds=delay),
+                         locked_by='',
+                         locked_at=None,
+                         **fields)
+    except IntegrityError:
+        owned.update(status=Job.FAILED, finished_at=timezone.now(), **fields)
+
+
+def run(job):
+    "Функция выполнения захваченной задачи с повтором при ошибке."
+
+    try:
+        func = tasks.get(job.name)
+        if func is None:
+            raise LookupError(f'Unknown task {job.name!r}')
+        func(**job.payload)
+    except Exception:
+        logger.exception('Job %s failed (attempt %s of %s)',
+                         job, job.attempts, job.max_attempts)
+        error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            requeue(job, get_backoff(job.attempts), last_error=error)
+        else:
+            Job.objects.filter(pk=job.pk, locked_by=job.locked_by).update(
+                status=Job.FAILED,
+                finished_at=timezone.now(),
+                last_error=error
+            )
+        return False
+
+    Job.objects.filter(pk=job.pk, locked_by=job.locked_by).update(
+        status=Job.DONE,
+        finished_at=timezone.now()
+    )
+    return True
+
+
+def beat(job, stop, interval):
+    "Функция продления захвата задачи, пока не установлен флаг stop."
+
+    try:
+        while not stop.wait(interval):
+            try:
+                Job.objects.filter(
+                    pk=job.pk, status=Job.RUNNING, locked_by=job.locked_by
+                ).update(locked_at=timezone.now())
+            except DatabaseError:
+                # Следующая попытка успеет до истечения LOCK_TIMEOUT.
+                logger.exception('Heartbeat of job %s failed', job)
+    finally:
+        connection.close()
+
+
+@contextlib.contextmanager
+def heartbeat(job):
+    """Контекстный менеджер, продлевающий из отдельного потока захват
+    задачи, пока она выполняется: release_stale вернет в очередь только
+    задачи воркеров, переставших отмечаться."""
+
+    stop = threading.Event()
+    thread = threading.Thread(
+        target=beat,
+        args=(job, stop, settings.JOBS['LOCK_TIMEOUT'] * HEARTBEAT_SHARE),
+        name=f'job-heartbeat-{job.pk}',
+        daemon=True
+    )
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def release_stale():
+    """Функция возврата в очередь задач, чей воркер не продлевал захват
+    дольше LOCK_TIMEOUT секунд: воркер погиб или завис."""
+
+    stale = Job.objects.filter(
+        status=Job.RUNNING,
+        locked_at__lt=timezone.now() - timedelta(
+            seconds=settings.JOBS['LOCK_TIMEOUT']
+        )
+    )
+    for job in stale:
+        error = f'Worker {job.locked_by} did not finish the job'
+        if job.attempts < job.max_attempts:
+            requeue(job, 0, last_error=error)
+        else:
+            Job.objects.filter(pk=job.pk, locked_by=job.locked_by).update(
+                status=Job.FAILED,
+                finished_at=timezone.now(),
+                last_error=error
+            )
+    return len(stale)
+
+
+def purge_done():
+    "Функция удаления выполненных задач старше KEEP_DONE секунд."
+
+    return Job.objects.filter(
+        status=Job.DONE,
+        finished_at__lt=timezone.now() - timedelta(
+            seconds=settings.JOBS['KEEP_DONE']
+        )
+    ).delete()[0]
@@ -8,6 +8,7 @@ from .models import (Favorite,
                      TagRecipe,
                      ShoppingCart,
                      Subscribe)
+from .tasks import schedule_signature_update
 
 
 class IngredientInRecipe(admin.TabularInline):
@@ -31,6 +32,10 @@ class RecipeAdmin(admin.ModelAdmin):
 
     inlines = [IngredientInRecipe, TagInRecipe]
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        schedule_signature_update(form.instance.pk)
+
     @admin.display(description='Количество добавлений в избранное')
     def additions_in_favorite_count(self, recipe):
         return recipe.in_favorite_for_users.all().count()
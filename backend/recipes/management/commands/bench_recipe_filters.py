@@ -0,0 +1,64 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import Ingredient
+
+
+class Command(BaseCommand):
+    help = ('Measure recipe list latency while ingredient include/exclude '
+            'filters are combined')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-filters', type=int, default=4)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        max_filters = options['max_filters']
+        popular_ids = list(Ingredient.objects.annotate(
+            usage=Count('recipes_used')
+        ).order_by('-usage').values_list('id', flat=True)[:max_filters * 2])
+        if len(popular_ids) < max_filters * 2:
+            raise CommandError('Not enough ingredients to combine filters')
+
+        included = popular_ids[:max_filters]
+        excluded = popular_ids[max_filters:]
+        client = Client()
+
+        self.stdout.write('include exclude queries   p50 ms   p95 ms')
+        for include_count in range(max_filters + 1):
+            for exclude_count in range(max_filters + 1):
+                params = {}
+                if include_count:
+                    params['ingredients'] = ','.join(
+                        map(str, included[:include_count])
+                    )
+                if exclude_count:
+                    params['exclude_ingredients'] = ','.join(
+                        map(str, excluded[:exclude_count])
+                    )
+
+                timings = []
+                for _ in range(options['repeat']):
+                    with CaptureQueriesContext(connection) as queries:
+                        started = time.perf_counter()
+                        response = client.get('/api/recipes/', params)
+                        timings.append(
+                            (time.perf_counter() - started) * 1000
+                        )
+                    if response.status_code != 200:
+                        raise CommandError(
+                            f'{params}: status {response.status_code}'
+                        )
+
+                p95 = statistics.quantiles(timings, n=20)[-1]
+                self.stdout.write(
+                    f'{include_count:7} {exclude_count:7} '
+                    f'{len(queries):7} '
+                    f'{statistics.median(timings):8.2f} {p95:8.2f}'
+                )
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from recipes.similarity import rebuild_similarity_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the MinHash/LSH index of recipe ingredient sets'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        indexed = rebuild_similarity_index(options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Indexed {indexed} recipes')
+        )
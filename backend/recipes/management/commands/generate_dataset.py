@@ -0,0 +1,236 @@
+import io
+import itertools
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from PIL import Image
+
+from recipes.models import (Favorite,
+                            Ingredient,
+                            IngredientRecipe,
+                            Recipe,
+                            ShoppingCart,
+                            Subscribe,
+                            Tag,
+                            TagRecipe)
+from users.models import CustomUser
+
+DEFAULT_TAGS = (
+    ('Завтрак', 'breakfast', '#E26C2D'),
+    ('Обед', 'lunch', '#49B64E'),
+    ('Ужин', 'dinner', '#8775D2'),
+)
+WORDS = ('соль', 'перец', 'обжарить', 'нарезать', 'варить', 'запекать',
+         'минут', 'добавить', 'смешать', 'подавать', 'горячим', 'тесто',
+         'соус', 'зелень', 'масло', 'духовка', 'сковорода', 'кастрюля')
+IMAGE_COLORS = ('#E26C2D', '#49B64E', '#8775D2', '#F4C430',
+                '#6A5ACD', '#20B2AA', '#CD5C5C', '#708090')
+
+
+def zipf_cum_weights(size, exponent=1.1):
+    "Функция построения накопленных весов распределения Ципфа."
+
+    return list(itertools.accumulate(
+        1 / rank ** exponent for rank in range(1, size + 1)
+    ))
+
+
+class Command(BaseCommand):
+    help = ('Generate a deterministic synthetic dataset of users, recipes '
+            'and relations for load testing')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=5000)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument('--subscriptions-per-user', type=int, default=10)
+        parser.add_argument('--favorites-per-user', type=int, default=20)
+        parser.add_argument('--cart-per-user', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--skip-index', action='store_true',
+                            help='Do not rebuild search/similarity indexes')
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.seed = options['seed']
+
+        ingredient_ids = list(
+            Ingredient.objects.order_by('pk').values_list('pk', flat=True)
+        )
+        if not ingredient_ids:
+            raise CommandError('No ingredients found, run import_csv first')
+        tag_ids = self.get_tag_ids()
+        images = self.create_images()
+
+        started = time.monotonic()
+        user_ids = self.generate_users(options['users'])
+        recipe_ids = self.generate_recipes(options['recipes'],
+                                           user_ids,
+                                           images)
+        self.generate_recipe_relations(recipe_ids,
+                                       tag_ids,
+                                       ingredient_ids,
+                                       options['ingredients_per_recipe'])
+        self.generate_user_relations(user_ids, recipe_ids, options)
+        self.reset_sequences()
+
+        if not options['skip_index']:
+            call_command('reindex_recipes', stdout=io.StringIO())
+            call_command('build_similarity_index', stdout=io.StringIO())
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Dataset generated in {time.monotonic() - started:.1f} s'
+        ))
+
+    def bulk_insert(self, model, objects):
+        created = 0
+        started = time.monotonic()
+        while True:
+            batch = list(itertools.islice(objects, self.batch_size))
+            if not batch:
+                break
+            with transaction.atomic():
+                model.objects.bulk_create(batch)
+            created += len(batch)
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f'{model.__name__}: {created} rows '
+            f'({created / elapsed if elapsed else 0:.0f} rows/s)'
+        )
+
+    def next_pk(self, model):
+        return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+    def pick_distinct(self, population, cum_weights, count, exclude=None):
+        picked = set()
+        count = min(count, len(population) - (exclude is not None))
+        while len(picked) < count:
+            value = self.random.choices(population, cum_weights=cum_weights)[0]
+            if value != exclude:
+                picked.add(value)
+        return picked
+
+    def get_tag_ids(self):
+        if not Tag.objects.exists():
+            Tag.objects.bulk_create(
+                Tag(name=name, slug=slug, color=color)
+                for name, slug, color in DEFAULT_TAGS
+            )
+        return list(Tag.objects.order_by('pk').values_list('pk', flat=True))
+
+    def create_images(self):
+        images = []
+        for index, color in enumerate(IMAGE_COLORS):
+            name = f'recipes/image/placeholder_{index}.png'
+            if not default_storage.exists(name):
+                buffer = io.BytesIO()
+                Image.new('RGB', (16, 16), color).save(buffer, 'PNG')
+                default_storage.save(name, ContentFile(buffer.getvalue()))
+            images.append(name)
+        return images
+
+    def generate_users(self, count):
+        first_pk = self.next_pk(CustomUser)
+        user_ids = list(range(first_pk, first_pk + count))
+        password = make_password('password')
+        self.bulk_insert(CustomUser, (
+            CustomUser(pk=pk,
+                       username=f'gen{self.seed}_{pk}',
+                       email=f'gen{self.seed}_{pk}@example.com',
+                       first_name=f'Имя{pk}',
+                       last_name=f'Фамилия{pk}',
+                       password=password)
+            for pk in user_ids
+        ))
+        return user_ids
+
+    def generate_recipes(self, count, user_ids, images):
+        first_pk = self.next_pk(Recipe)
+        recipe_ids = list(range(first_pk, first_pk + count))
+        authors = zipf_cum_weights(len(user_ids))
+        self.bulk_insert(Recipe, (
+            Recipe(pk=pk,
+                   name=f'Рецепт {pk}',
+                   text=' '.join(self.random.choices(
+                       WORDS, k=self.random.randint(10, 80)
+                   )),
+                   author_id=self.random.choices(user_ids,
+                                                 cum_weights=authors)[0],
+                   image=self.random.choice(images),
+                   cooking_time=max(1, min(600, int(
+                       self.random.lognormvariate(3.3, 0.6)
+                   ))))
+            for pk in recipe_ids
+        ))
+        return recipe_ids
+
+    def generate_recipe_relations(self, recipe_ids, tag_ids,
+                                  ingredient_ids, ingredients_per_recipe):
+        tag_weights = zipf_cum_weights(len(tag_ids), exponent=0.7)
+        ingredient_weights = zipf_cum_weights(len(ingredient_ids))
+
+        self.bulk_insert(TagRecipe, (
+            TagRecipe(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id in recipe_ids
+            for tag_id in self.pick_distinct(tag_ids,
+                                             tag_weights,
+                                             self.random.randint(1, 3))
+        ))
+        self.bulk_insert(IngredientRecipe, (
+            IngredientRecipe(recipe_id=recipe_id,
+                             ingredient_id=ingredient_id,
+                             amount=self.random.randint(1, 500))
+            for recipe_id in recipe_ids
+            for ingredient_id in self.pick_distinct(
+                ingredient_ids,
+                ingredient_weights,
+                max(1, int(self.random.expovariate(
+                    1 / ingredients_per_recipe
+                )))
+            )
+        ))
+
+    def generate_user_relations(self, user_ids, recipe_ids, options):
+        author_weights = zipf_cum_weights(len(user_ids))
+        recipe_weights = zipf_cum_weights(len(recipe_ids))
+
+        def per_user(mean):
+            return int(self.random.expovariate(1 / mean)) if mean else 0
+
+        self.bulk_insert(Subscribe, (
+            Subscribe(user_id=user_id, author_id=author_id)
+            for user_id in user_ids
+            for author_id in self.pick_distinct(
+                user_ids,
+                author_weights,
+                per_user(options['subscriptions_per_user']),
+                exclude=user_id
+            )
+        ))
+        for model, mean in ((Favorite, options['favorites_per_user']),
+                            (ShoppingCart, options['cart_per_user'])):
+            self.bulk_insert(model, (
+                model(user_id=user_id, recipe_id=recipe_id)
+                for user_id in user_ids
+                for recipe_id in self.pick_distinct(recipe_ids,
+                                                    recipe_weights,
+                                                    per_user(mean))
+            ))
+
+    def reset_sequences(self):
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), [CustomUser, Recipe]
+        )
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
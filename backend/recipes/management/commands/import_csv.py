@@ -1,22 +1,146 @@
 import csv
+import io
+import json
+import time
+
+from itertools import islice
+
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
 from recipes.models import Ingredient
 
+DEFAULT_BATCH_SIZE = 1000
+JSON_CHUNK_SIZE = 64 * 1024
+
+
+def read_csv_rows(path):
+    "Функция потокового чтения ингредиентов из CSV-файла."
+
+    with open(path, encoding='utf-8', newline='') as csvfile:
+        for row in csv.DictReader(csvfile):
+            yield row['name'].strip(), row['measurement_unit'].strip()
+
+
+def read_json_rows(path):
+    "Функция потокового чтения ингредиентов из JSON-массива."
+
+    decoder = json.JSONDecoder()
+    with open(path, encoding='utf-8') as jsonfile:
+        buffer = jsonfile.read(JSON_CHUNK_SIZE).lstrip()
+        if not buffer.startswith('['):
+            raise CommandError('JSON file must contain an array')
+        buffer = buffer[1:]
+
+        while True:
+            buffer = buffer.lstrip().lstrip(',').lstrip()
+            if buffer.startswith(']'):
+                return
+            try:
+                item, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                chunk = jsonfile.read(JSON_CHUNK_SIZE)
+                if not chunk:
+                    raise CommandError('Unexpected end of JSON file')
+                buffer += chunk
+                continue
+            buffer = buffer[end:]
+            yield item['name'].strip(), item['measurement_unit'].strip()
+
+
+def import_batch_postgresql(cursor, batch):
+    "Функция загрузки пачки через COPY во временную таблицу."
+
+    stream = io.StringIO()
+    csv.writer(stream).writerows(batch)
+    stream.seek(0)
 
-def import_data():
-    with open(
-        f'{settings.BASE_DIR}/data/ingredients.csv', encoding='utf-8'
-    ) as csvfile:
-        reader = csv.DictReader(csvfile)
-        ingredients = [Ingredient(**row) for row in reader]
+    cursor.execute('TRUNCATE ingredient_staging')
+    cursor.copy_expert(
+        'COPY ingredient_staging (name, measurement_unit) '
+        'FROM STDIN WITH (FORMAT csv)',
+        stream
+    )
+    cursor.execute(
+        'INSERT INTO recipes_ingredient (name, measurement_unit) '
+        'SELECT DISTINCT name, measurement_unit FROM ingredient_staging '
+        'ON CONFLICT (name, measurement_unit) DO NOTHING'
+    )
 
-        Ingredient.objects.bulk_create(ingredients)
+
+def import_batch_default(cursor, batch):
+    "Функция загрузки пачки через bulk_create с пропуском дубликатов."
+
+    Ingredient.objects.bulk_create(
+        [Ingredient(name=name, measurement_unit=measurement_unit)
+         for name, measurement_unit in batch],
+        ignore_conflicts=True
+    )
+
+
+def import_data(path, batch_size=DEFAULT_BATCH_SIZE, report=None):
+    """Функция идемпотентного импорта ингредиентов пачками фиксированного
+    размера. Возвращает количество обработанных и добавленных строк."""
+
+    if path.endswith('.json'):
+        rows = read_json_rows(path)
+    else:
+        rows = read_csv_rows(path)
+
+    if connection.vendor == 'postgresql':
+        import_batch = import_batch_postgresql
+    else:
+        import_batch = import_batch_default
+
+    initial_count = Ingredient.objects.count()
+    processed = 0
+    started = time.monotonic()
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                'CREATE TEMP TABLE IF NOT EXISTS ingredient_staging '
+                '(name varchar(200), measurement_unit varchar(200))'
+            )
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            with transaction.atomic():
+                import_batch(cursor, batch)
+            processed += len(batch)
+            if report:
+                elapsed = time.monotonic() - started
+                report(processed, processed / elapsed if elapsed else 0)
+
+    return processed, Ingredient.objects.count() - initial_count
 
 
 class Command(BaseCommand):
-    help = 'Import Ingredients data from a CSV file into the Ingredients model'
+    help = ('Import Ingredients data from a CSV or JSON file into '
+            'the Ingredients model')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default=f'{settings.BASE_DIR}/data/ingredients.csv'
+        )
+        parser.add_argument('--batch-size',
+                            type=int,
+                            default=DEFAULT_BATCH_SIZE)
+
+    def report(self, processed, rate):
+        self.stdout.write(f'Processed {processed} rows ({rate:.0f} rows/s)')
 
     def handle(self, *args, **options):
-        import_data()
-        self.stdout.write(self.style.SUCCESS('Data imported successfully'))
+        try:
+            processed, created = import_data(options['path'],
+                                             options['batch_size'],
+                                             self.report)
+        except (OSError, KeyError) as error:
+            raise CommandError(f'Cannot import {options["path"]}: {error}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Data imported successfully: {processed} rows processed, '
+            f'{created} ingredients added'
+        ))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+from recipes.search import clear_search_index, update_search_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index of recipes in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        recipe_ids = Recipe.objects.order_by('pk').values_list('pk',
+                                                               flat=True)
+        clear_search_index()
+
+        last_id, indexed = 0, 0
+        while True:
+            batch = list(recipe_ids.filter(pk__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            update_search_index(batch)
+            last_id = batch[-1]
+            indexed += len(batch)
+            self.stdout.write(f'Indexed {indexed} recipes')
+
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt'))
@@ -0,0 +1,53 @@
+# Generated by Django 3.2.20 on 2026-10-19 19:19
+
+from django.db import migrations
+from django.db.models import Count, F, Min, OuterRef, Subquery
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    IngredientRecipe = apps.get_model('recipes', 'IngredientRecipe')
+
+    duplicates = Ingredient.objects.values(
+        'name', 'measurement_unit'
+    ).annotate(keep_id=Min('id'), total=Count('id')).filter(total__gt=1)
+
+    for duplicate in list(duplicates):
+        keep_id = duplicate['keep_id']
+        duplicate_ids = list(Ingredient.objects.filter(
+            name=duplicate['name'],
+            measurement_unit=duplicate['measurement_unit']
+        ).exclude(id=keep_id).values_list('id', flat=True))
+
+        used_in = IngredientRecipe.objects.filter(ingredient_id=keep_id)
+        for ingredient_id in duplicate_ids:
+            # Если в рецепте уже есть оставляемый ингредиент, количество
+            # дубликата прибавляется к нему, а строка дубликата удаляется.
+            merged = IngredientRecipe.objects.filter(
+                ingredient_id=ingredient_id,
+                recipe_id__in=used_in.values('recipe_id')
+            )
+            used_in.filter(
+                recipe_id__in=merged.values('recipe_id')
+            ).update(amount=F('amount') + Subquery(
+                merged.filter(recipe_id=OuterRef('recipe_id')).values(
+                    'amount'
+                )[:1]
+            ))
+            merged.delete()
+            IngredientRecipe.objects.filter(
+                ingredient_id=ingredient_id
+            ).update(ingredient_id=keep_id)
+        Ingredient.objects.filter(id__in=duplicate_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0020_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_ingredients,
+                             migrations.RunPython.noop),
+    ]
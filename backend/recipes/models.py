@@ -1,5 +1,8 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models import Lookup
 
 from colorfield.fields import ColorField
 
@@ -30,6 +33,10 @@ class Ingredient(models.Model):
         ordering = ['name']
         verbose_name = 'Ingredient'
         verbose_name_plural = 'Ingredients'
+        constraints = [
+            models.UniqueConstraint(fields=['name', 'measurement_unit'],
+                                    name='unique_ingredient')
+        ]
 
     def __str__(self):
         return self.name
@@ -65,12 +72,17 @@ class Recipe(models.Model):
         auto_now_add=True,
         db_index=True
     )
+    search_vector = SearchVectorField(null=True, editable=False)
 
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Recipe'
         verbose_name_plural = 'Recipes'
         default_related_name = 'recipes'
+        indexes = [
+            GinIndex(fields=['search_vector'],
+                     name='recipe_search_vector_idx')
+        ]
 
     def __str__(self):
         return self.name
@@ -198,3 +210,66 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return f'{self.user} {self.recipe}'
+
+
+class RecipeSignature(models.Model):
+    "Модель MinHash-сигнатуры набора ингредиентов рецепта."
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='signature'
+    )
+    signature = models.JSONField('Сигнатура')
+
+    def __str__(self):
+        return f'{self.recipe}'
+
+
+class RecipeBucket(models.Model):
+    "Модель LSH-корзины рецепта."
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='lsh_buckets'
+    )
+    bucket = models.BigIntegerField('Корзина', db_index=True)
+
+    def __str__(self):
+        return f'{self.recipe} {self.bucket}'
+
+
+class FullTextDocumentField(models.TextField):
+    "Поле скрытого столбца FTS5 с именем таблицы, по которому идет поиск."
+
+
+@FullTextDocumentField.register_lookup
+class FullTextMatch(Lookup):
+    "Условие полнотекстового совпадения FTS5: <столбец> MATCH <запрос>."
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', (*lhs_params, *rhs_params)
+
+
+class RecipeSearchIndex(models.Model):
+    """Модель строки индекса FTS5 рецептов (только SQLite). Таблицу
+    создает миграция и наполняет recipes.search, Django ей не управляет."""
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        db_column='rowid',
+        db_constraint=False,
+        related_name='search_index'
+    )
+    document = FullTextDocumentField(db_column='recipes_recipe_fts')
+
+    class Meta:
+        managed = False
+        db_table = 'recipes_recipe_fts'
+
+    def __str__(self):
+        return f'{self.recipe}'
@@ -0,0 +1,99 @@
+import re
+
+from django.contrib.postgres.search import (SearchQuery,
+                                            SearchRank,
+                                            SearchVector)
+from django.db import connection, connections
+from django.db.models import F, FloatField, Func, Q, Value
+
+from .models import Recipe, RecipeSearchIndex
+
+SEARCH_CONFIG = 'russian'
+FTS_TABLE = RecipeSearchIndex._meta.db_table
+
+
+def get_search_vector():
+    "Функция построения поискового вектора рецепта."
+
+    return (SearchVector('name', weight='A', config=SEARCH_CONFIG)
+            + SearchVector('text', weight='B', config=SEARCH_CONFIG))
+
+
+def update_search_index(recipe_ids):
+    "Функция обновления поискового индекса для переданных рецептов."
+
+    recipe_ids = list(recipe_ids)
+    if connection.vendor == 'postgresql':
+        Recipe.objects.filter(
+            pk__in=recipe_ids
+        ).update(search_vector=get_search_vector())
+    elif connection.vendor == 'sqlite':
+        placeholders = ', '.join(['%s'] * len(recipe_ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})',
+                recipe_ids
+            )
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, text) '
+                f'SELECT id, name, text FROM recipes_recipe '
+                f'WHERE id IN ({placeholders})',
+                recipe_ids
+            )
+
+
+def remove_from_search_index(recipe_id):
+    "Функция удаления рецепта из поискового индекса."
+
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                           [recipe_id])
+
+
+def clear_search_index():
+    "Функция очистки поискового индекса перед полной переиндексацией."
+
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+
+
+class BM25(Func):
+    """Ранг строки индекса FTS5 (больше - лучше): bm25 с весами
+    столбцов name и text."""
+    function = 'bm25'
+    template = '-%(function)s(%(expressions)s)'
+    output_field = FloatField()
+
+
+def search_recipes(queryset, query):
+    "Функция полнотекстового поиска рецептов с ранжированием."
+
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        search_query = SearchQuery(query,
+                                   config=SEARCH_CONFIG,
+                                   search_type='websearch')
+        return queryset.filter(
+            search_vector=search_query
+        ).annotate(
+            search_rank=SearchRank(F('search_vector'), search_query)
+        ).order_by('-search_rank', '-pub_date')
+
+    if vendor != 'sqlite':
+        return queryset.filter(Q(name__icontains=query)
+                               | Q(text__icontains=query))
+
+    terms = re.findall(r'\w+', query)
+    if not terms:
+        return queryset.none()
+    # Индекс присоединяется к рецептам в том же запросе, что и остальные
+    # фильтры: SQLite просматривает совпадения FTS5 и находит рецепты
+    # по первичному ключу, ранг считается в том же проходе.
+    return queryset.filter(
+        search_index__document__match=' '.join(f'"{term}"*'
+                                               for term in terms)
+    ).annotate(
+        search_rank=BM25('search_index__document', Value(10.0), Value(1.0))
+    ).order_by('-search_rank', '-pub_date')
@@ -0,0 +1,154 @@
+import random
+
+from hashlib import blake2b
+from itertools import groupby
+
+from django.db import transaction
+from django.db.models import Count
+
+from .models import IngredientRecipe, Recipe, RecipeBucket, RecipeSignature
+
+NUM_PERMUTATIONS = 64
+# Порог LSH (1 / BANDS) ** (1 / ROWS): рецепты с коэффициентом Жаккара
+# от ~0.5 попадают хотя бы в одну общую корзину.
+BANDS = 16
+ROWS = NUM_PERMUTATIONS // BANDS
+CANDIDATES_LIMIT = 200
+# Корзины, в которые попало больше рецептов, при поиске пропускаются:
+# популярное сочетание ингредиентов не должно тянуть тысячи кандидатов.
+BUCKET_LIMIT = 500
+
+_PRIME = (1 << 61) - 1
+_random = random.Random(83)
+_PERMUTATIONS = [
+    (_random.randrange(1, _PRIME), _random.randrange(0, _PRIME))
+    for _ in range(NUM_PERMUTATIONS)
+]
+
+
+def compute_signature(ingredient_ids):
+    "Функция вычисления MinHash-сигнатуры набора ингредиентов."
+
+    return [min((a * ingredient_id + b) % _PRIME
+                for ingredient_id in ingredient_ids)
+            for a, b in _PERMUTATIONS]
+
+
+def get_buckets(signature):
+    "Функция разбиения сигнатуры на LSH-корзины (по одной на полосу)."
+
+    buckets = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS:(band + 1) * ROWS]
+        digest = blake2b(
+            f'{band}:{rows}'.encode(), digest_size=8
+        ).digest()
+        buckets.append(int.from_bytes(digest, 'big', signed=True))
+    return buckets
+
+
+def estimate_similarity(signature, other_signature):
+    "Функция оценки коэффициента Жаккара по двум сигнатурам."
+
+    matches = sum(
+        value == other_value
+        for value, other_value in zip(signature, other_signature)
+    )
+    return matches / NUM_PERMUTATIONS
+
+
+def _index_objects(recipe_id, ingredient_ids):
+    signature = compute_signature(ingredient_ids)
+    buckets = [RecipeBucket(recipe_id=recipe_id, bucket=bucket)
+               for bucket in get_buckets(signature)]
+    return RecipeSignature(recipe_id=recipe_id, signature=signature), buckets
+
+
+def update_recipe_signature(recipe):
+    "Функция обновления сигнатуры рецепта в LSH-индексе."
+
+    ingredient_ids = list(IngredientRecipe.objects.filter(
+        recipe=recipe
+    ).values_list('ingredient_id', flat=True))
+
+    with transaction.atomic():
+        RecipeBucket.objects.filter(recipe=recipe).delete()
+        RecipeSignature.objects.filter(recipe=recipe).delete()
+        if ingredient_ids:
+            signature, buckets = _index_objects(recipe.pk, ingredient_ids)
+            signature.save()
+            RecipeBucket.objects.bulk_create(buckets)
+
+
+def rebuild_similarity_index(batch_size=1000):
+    """Функция полного перестроения LSH-индекса рецептов. Рецепты идут
+    пачками по первичному ключу, каждая пачка - отдельная транзакция:
+    индекс остается доступным для поиска, пока идет перестроение."""
+
+    indexed = 0
+    last_id = 0
+
+    while True:
+        batch_ids = list(Recipe.objects.filter(
+            pk__gt=last_id
+        ).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not batch_ids:
+            break
+        last_id = batch_ids[-1]
+
+        rows = IngredientRecipe.objects.filter(
+            recipe_id__in=batch_ids
+        ).order_by('recipe_id').values_list('recipe_id', 'ingredient_id')
+        signatures, buckets = [], []
+        for recipe_id, group in groupby(rows, key=lambda row: row[0]):
+            signature, recipe_buckets = _index_objects(
+                recipe_id, [ingredient_id for _, ingredient_id in group]
+            )
+            signatures.append(signature)
+            buckets.extend(recipe_buckets)
+
+        with transaction.atomic():
+            RecipeBucket.objects.filter(recipe_id__in=batch_ids).delete()
+            RecipeSignature.objects.filter(recipe_id__in=batch_ids).delete()
+            RecipeSignature.objects.bulk_create(signatures)
+            RecipeBucket.objects.bulk_create(buckets)
+        indexed += len(signatures)
+
+    return indexed
+
+
+def get_similar_recipes(recipe, limit):
+    """Функция поиска рецептов с наиболее похожим набором ингредиентов.
+    Возвращает список пар (id рецепта, оценка коэффициента Жаккара)."""
+
+    signature = RecipeSignature.objects.filter(
+        recipe=recipe
+    ).values_list('signature', flat=True).first()
+    if signature is None:
+        return []
+
+    buckets = get_buckets(signature)
+    small_buckets = RecipeBucket.objects.filter(
+        bucket__in=buckets
+    ).values('bucket').annotate(
+        size=Count('id')
+    ).filter(size__lte=BUCKET_LIMIT).values('bucket')
+    candidate_ids = RecipeBucket.objects.filter(
+        bucket__in=small_buckets
+    ).exclude(
+        recipe=recipe
+    ).values('recipe_id').annotate(
+        matches=Count('id')
+    ).order_by('-matches').values_list('recipe_id',
+                                       flat=True)[:CANDIDATES_LIMIT]
+
+    candidates = RecipeSignature.objects.filter(
+        recipe_id__in=list(candidate_ids)
+    ).values_list('recipe_id', 'signature')
+
+    similar = [
+        (recipe_id, estimate_similarity(signature, candidate_signature))
+        for recipe_id, candidate_signature in candidates
+    ]
+    similar.sort(key=lambda item: (-item[1], -item[0]))
+    return similar[:limit]
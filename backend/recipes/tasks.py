@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.db import transaction
+
+from jobs.queue import enqueue, task
+
+from .models import Recipe
+from .similarity import rebuild_similarity_index, update_recipe_signature
+
+
+@task('recipes.update_signature')
+def update_signature(recipe_id):
+    recipe = Recipe.objects.filter(pk=recipe_id).first()
+    # Рецепт могли удалить, пока задача ждала в очереди.
+    if recipe is not None:
+        update_recipe_signature(recipe)
+
+
+@task('recipes.rebuild_similarity_index')
+def rebuild_index(batch_size=1000):
+    rebuild_similarity_index(batch_size)
+
+
+def schedule_signature_update(recipe_id):
+    """Функция постановки пересчета сигнатуры рецепта в очередь после
+    фиксации транзакции; повторные правки до запуска задачи сливаются.
+    Без воркера фоновых задач (JOBS['ASYNC'] = False) сигнатура
+    пересчитывается сразу после фиксации."""
+
+    if not settings.JOBS['ASYNC']:
+        transaction.on_commit(lambda: update_signature(recipe_id))
+        return
+    transaction.on_commit(lambda: enqueue(
+        'recipes.update_signature',
+        {'recipe_id': recipe_id},
+        dedup_key=f'signature:{recipe_id}'
+    ))